@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import itertools
+import numpy
+from concurrent.futures import ProcessPoolExecutor
+from fitter import Experiment, OpticalFitter
+from opticalsolver import PARAMETERS
+
+
+class Family:
+    def __init__(self, n: float, constant: float, points: numpy.ndarray) -> None:
+        self.__n = n
+        self.__constant = constant
+        self.__points = points
+
+    @property
+    def n(self) -> float:
+        return self.__n
+
+    @property
+    def constant(self) -> float:
+        '''
+        Invariant of the family, `Vr * rv^n`
+
+        :return: constant, MeV * fm^n
+        :rtype: float
+        '''
+        return self.__constant
+
+    @property
+    def points(self) -> numpy.ndarray:
+        '''
+        Valley of the family in the (rv, Vr) plane
+
+        :return: rows of (rv, Vr, chi2)
+        :rtype: numpy.ndarray
+        '''
+        return self.__points
+
+
+class Landscape:
+    '''
+    Chi2 over a rectangular grid of optical parameters. Points in pruned regions hold `inf`.
+    '''
+    def __init__(self, names: list[str], axes: list[numpy.ndarray], chi2: numpy.ndarray, bound: float) -> None:
+        self.__names = list(names)
+        self.__axes = [numpy.asarray(axis, dtype=float) for axis in axes]
+        self.__chi2 = chi2
+        self.__bound = bound
+
+    @property
+    def names(self) -> list[str]:
+        return self.__names
+
+    @property
+    def axes(self) -> list[numpy.ndarray]:
+        return self.__axes
+
+    @property
+    def chi2(self) -> numpy.ndarray:
+        return self.__chi2
+
+    @property
+    def bound(self) -> float:
+        return self.__bound
+
+    @property
+    def evaluated(self) -> float:
+        return float(numpy.mean(numpy.isfinite(self.__chi2)))
+
+    def minimum(self) -> dict[str, float]:
+        index = numpy.unravel_index(numpy.argmin(self.__chi2), self.__chi2.shape)
+        return {name: float(axis[i]) for name, axis, i in zip(self.__names, self.__axes, index)}
+
+    def profile(self, first: str, second: str) -> numpy.ndarray:
+        '''
+        Chi2 minimised over every axis but two
+
+        :return: chi2 with shape `(len(first axis), len(second axis))`
+        :rtype: numpy.ndarray
+        '''
+        i, j = self.__names.index(first), self.__names.index(second)
+        others = tuple(k for k in range(len(self.__names)) if k not in (i, j))
+        profile = numpy.min(self.__chi2, axis=others) if others else self.__chi2
+
+        return profile if i < j else profile.T
+
+    def families(self) -> list[Family]:
+        '''
+        Discrete ambiguities of the real depth and their continuous `Vr * rv^n = const` valleys.
+        For every rv the local minima of the (rv, Vr) profile below the bound are ordered by depth,
+        the k-th minimum of each rv joins the k-th family and `n` is fitted to `log Vr` against `log rv`.
+
+        :return: families ordered by depth
+        :rtype: list[Family]
+        '''
+        profile = self.profile('rv', 'Vr')
+        rvs, depths = self.__axes[self.__names.index('rv')], self.__axes[self.__names.index('Vr')]
+
+        valleys: list[list[tuple[float, float, float]]] = []
+        for rv, row in zip(rvs, profile):
+            padded = numpy.concatenate([[numpy.inf], row, [numpy.inf]])
+            minima = numpy.flatnonzero((row <= padded[:-2]) & (row < padded[2:]) & (row <= self.__bound))
+
+            for k, i in enumerate(minima):
+                if k == len(valleys):
+                    valleys.append([])
+                valleys[k].append((rv, depths[i], row[i]))
+
+        families = []
+        for valley in valleys:
+            points = numpy.array(valley)
+            if len(points) < 2:
+                continue
+
+            slope, intercept = numpy.polyfit(numpy.log(points[:, 0]), numpy.log(points[:, 1]), 1)
+            families.append(Family(-slope, float(numpy.exp(intercept)), points))
+
+        return families
+
+    def save(self, file: str) -> None:
+        numpy.savez_compressed(file, names=numpy.array(self.__names), chi2=self.__chi2.astype(numpy.float32),
+                               bound=self.__bound, **{f'axis_{i}': axis for i, axis in enumerate(self.__axes)})
+
+    @classmethod
+    def load(cls, file: str) -> Landscape:
+        with numpy.load(file) as data:
+            names = data['names'].tolist()
+            axes = [data[f'axis_{i}'] for i in range(len(names))]
+            return cls(names, axes, data['chi2'], float(data['bound']))
+
+
+class AmbiguityScanner:
+    '''
+    Dense chi2 scans of one reaction over a grid of some optical parameters, the rest held at `params`.
+
+    Pruning runs in two passes. Every `stride`-th node along each axis is solved first and scored
+    on `coarse` angles only; that partial sum is a lower bound of the full chi2 at the node.
+    A grid cell is then solved on all angles only when one of its corners stays within `margin` times
+    the bound, and the neighbours of such cells are solved as well, so hopeless regions cost one solve
+    per `stride^d` points.
+
+    The pruning is a heuristic: the coarse chi2 bounds the full chi2 only at the nodes, not between them,
+    and a valley narrower than a cell can pass between nodes that all lie above the bound. `margin` and
+    the one-cell border make that unlikely, not impossible; `margin=numpy.inf` or `stride=1` scans everything.
+    '''
+    def __init__(self, experiment: Experiment, params: numpy.ndarray, stride: int = 4, coarse: int = 8, chunk: int = 4096,
+                 margin: float = 4.0) -> None:
+        self.__experiment = experiment
+        self.__params = numpy.asarray(params, dtype=float)
+        self.__stride = stride
+        self.__chunk = chunk
+        self.__margin = margin
+
+        indices = numpy.unique(numpy.linspace(0, len(experiment.angles) - 1, min(coarse, len(experiment.angles))).astype(int))
+        self.__coarse = Experiment(experiment.projectile, experiment.target, experiment.energy, experiment.angles[indices],
+                                   experiment.xsections[indices], experiment.uncertainties[indices])
+
+    @property
+    def experiment(self) -> Experiment:
+        return self.__experiment
+
+    @property
+    def params(self) -> numpy.ndarray:
+        return self.__params.copy()
+
+    def scan(self, grids: dict[str, numpy.ndarray], bound: float = None, workers: int = None) -> Landscape:
+        '''
+        Chi2 landscape over the grids, evaluated in chunks across a process pool.
+        Without a `bound` the full chi2 of the best coarse node times 4 is taken.
+
+        :return: chi2 over `grids`, `inf` where pruned
+        :rtype: Landscape
+        '''
+        names = [name for name in PARAMETERS if name in grids]
+        axes = [numpy.asarray(grids[name], dtype=float) for name in names]
+        columns = [PARAMETERS.index(name) for name in names]
+        shape = tuple(len(axis) for axis in axes)
+
+        nodes = [numpy.unique(numpy.append(numpy.arange(0, n, self.__stride), n - 1)) for n in shape]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            lower = self.__evaluate(pool, self.__coarse, self.__points(axes, columns, nodes)).reshape([len(n) for n in nodes])
+
+            if bound is None:
+                best = numpy.unravel_index(numpy.argmin(lower), lower.shape)
+                point = self.__points(axes, columns, [n[[i]] for n, i in zip(nodes, best)])
+                bound = 4 * float(OpticalFitter(self.__experiment).chi2(point)[0])
+
+            # A cell survives when any of its 2^d corners comes within the margin of the bound,
+            # and so do its neighbours, in case a valley runs between the nodes
+            hopeful = lower <= self.__margin * bound
+            marked = numpy.zeros([max(len(n) - 1, 1) for n in nodes], dtype=bool)
+            for corner in itertools.product((0, 1), repeat=len(nodes)):
+                marked |= hopeful[tuple(slice(c, c + marked.shape[k]) if len(nodes[k]) > 1 else slice(None) for k, c in enumerate(corner))]
+
+            padded = numpy.pad(marked, 1)
+            cells = numpy.zeros_like(marked)
+            for shift in itertools.product((0, 1, 2), repeat=len(nodes)):
+                cells |= padded[tuple(slice(c, c + size) for c, size in zip(shift, marked.shape))]
+
+            owner = [numpy.minimum(numpy.searchsorted(n, numpy.arange(size), side='right') - 1, max(len(n) - 2, 0))
+                     for n, size in zip(nodes, shape)]
+            survivors = numpy.flatnonzero(cells[numpy.ix_(*owner)])
+
+            chi2 = numpy.full(shape, numpy.inf)
+            index = numpy.unravel_index(survivors, shape)
+            points = numpy.repeat(self.__params[None, :], len(survivors), axis=0)
+            for k, column in enumerate(columns):
+                points[:, column] = axes[k][index[k]]
+
+            chi2[index] = self.__evaluate(pool, self.__experiment, points)
+
+        return Landscape(names, axes, chi2, bound)
+
+    def __points(self, axes: list[numpy.ndarray], columns: list[int], indices: list[numpy.ndarray]) -> numpy.ndarray:
+        mesh = numpy.meshgrid(*[axis[i] for axis, i in zip(axes, indices)], indexing='ij')
+        points = numpy.repeat(self.__params[None, :], mesh[0].size, axis=0)
+        for column, values in zip(columns, mesh):
+            points[:, column] = values.ravel()
+
+        return points
+
+    def __evaluate(self, pool: ProcessPoolExecutor, experiment: Experiment, points: numpy.ndarray) -> numpy.ndarray:
+        if len(points) == 0:
+            return numpy.empty(0)
+
+        chunks = [points[i:i + self.__chunk] for i in range(0, len(points), self.__chunk)]
+        return numpy.concatenate(list(pool.map(chi2_chunk, [experiment] * len(chunks), chunks)))
+
+
+def chi2_chunk(experiment: Experiment, points: numpy.ndarray) -> numpy.ndarray:
+    return OpticalFitter(experiment).chi2(points)
+
+
+if __name__ == '__main__':
+    pass
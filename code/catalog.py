@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import os
+import hashlib
+import sqlite3
+import numpy
+from nuclei import Nuclei
+from dataset import DatasetTable
+from ecisreader import EcisReader, walk
+from ecisdeck import COUNT, read_cards
+from ecisoutput import read_report
+from query import Reaction, as_nuclei
+from storage import open_text, locate, plain_name
+
+
+LABELS = DatasetTable.LABELS
+
+# Bumped whenever SCHEMA changes; an older catalog is dropped and rebuilt by the next `update`
+VERSION = 2
+
+SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS reactions (
+    id INTEGER PRIMARY KEY,
+    projectile INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    energy REAL NOT NULL,
+    UNIQUE (projectile, target, energy)
+);
+CREATE TABLE IF NOT EXISTS experiments (
+    file TEXT PRIMARY KEY, version TEXT, reaction INTEGER REFERENCES reactions (id),
+    mtime INTEGER, size INTEGER, doi TEXT, points INTEGER, angles TEXT
+);
+CREATE TABLE IF NOT EXISTS decks (
+    file TEXT PRIMARY KEY, version TEXT, reaction INTEGER REFERENCES reactions (id),
+    mtime INTEGER, size INTEGER, angles TEXT, experiment TEXT, {', '.join(label + ' REAL' for label in LABELS)}
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    file TEXT PRIMARY KEY, version TEXT, reaction INTEGER REFERENCES reactions (id), deck TEXT,
+    mtime INTEGER, size INTEGER, chi2 REAL, chi2_initial REAL, sigma_r REAL, complete INTEGER,
+    {', '.join(label + ' REAL' for label in LABELS)}
+);
+CREATE INDEX IF NOT EXISTS experiments_reaction ON experiments (reaction);
+CREATE INDEX IF NOT EXISTS decks_reaction ON decks (reaction);
+CREATE INDEX IF NOT EXISTS outputs_reaction ON outputs (reaction);
+CREATE INDEX IF NOT EXISTS outputs_deck ON outputs (deck);
+CREATE INDEX IF NOT EXISTS reactions_target ON reactions (target, energy);
+CREATE VIEW IF NOT EXISTS runs AS
+    SELECT r.projectile, r.target, r.energy, d.version, e.file AS experiment, d.file AS deck, o.file AS output,
+           o.chi2, o.chi2_initial, o.sigma_r, {', '.join(f'd.{label}' for label in LABELS)},
+           {', '.join(f'o.{label} AS fit_{label}' for label in LABELS)}
+    FROM decks d
+    JOIN reactions r ON r.id = d.reaction
+    LEFT JOIN outputs o ON o.deck = d.file
+    LEFT JOIN experiments e ON e.file = d.experiment;
+'''
+TABLES = ('runs', 'outputs', 'decks', 'experiments', 'reactions')
+
+
+class Catalog:
+    '''
+    SQLite index of the `xsections` and `ecis` trees under `root`, all versions at once: reactions keyed by
+    projectile and target ZAID and lab energy, linked to their experimental files, input decks and ECIS reports
+    with the fitted potential and final chi2. The `runs` view joins them, one row per deck: every deck is linked
+    to the experimental file it was generated from, the one of its reaction and version with the same angles,
+    else the next one in file order as `EcisGenerator.claim` numbers `_in`, `_in_2`, ...
+    `update` re-reads only files whose mtime or size changed and drops the ones gone from disk, along with
+    reactions nothing refers to any more.
+
+        Catalog('..').select(projectile='7Li', target='28Si')
+    '''
+    def __init__(self, root: str, database: str = None) -> None:
+        self.__root = root
+        self.__connection = sqlite3.connect(os.path.join(root, 'catalog.sqlite') if database is None else database)
+        self.__connection.row_factory = sqlite3.Row
+
+        if self.__connection.execute('PRAGMA user_version').fetchone()[0] != VERSION:
+            with self.__connection:
+                for table in TABLES:
+                    kind = 'VIEW' if table == 'runs' else 'TABLE'
+                    self.__connection.execute(f'DROP {kind} IF EXISTS {table}')
+                self.__connection.execute(f'PRAGMA user_version = {VERSION}')
+
+        self.__connection.executescript(SCHEMA)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self.__connection
+
+    def close(self) -> None:
+        self.__connection.close()
+
+    def update(self, errors: list[tuple[str, Exception]] = None) -> int:
+        '''
+        Brings the catalog in line with the trees; files that fail to parse are appended to `errors`
+
+        :return: number of files (re)indexed or dropped
+        :rtype: int
+        '''
+        changes = 0
+
+        with self.__connection:
+            for table, tree in (('experiments', 'xsections'), ('decks', 'ecis'), ('outputs', 'ecis')):
+                stamps = {row['file']: (row['mtime'], row['size']) for row in self.__connection.execute(f'SELECT file, mtime, size FROM {table}')}
+                present = set()
+
+                for file in walk(os.path.join(self.__root, tree)):
+                    reaction = Reaction.from_name(file)
+                    if reaction is None or kind_table(reaction.kind) != table:
+                        continue
+
+                    key = os.path.relpath(file, self.__root)
+                    stat = os.stat(file)
+                    present.add(key)
+                    if stamps.get(key) == (stat.st_mtime_ns, stat.st_size):
+                        continue
+
+                    try:
+                        self.__index(table, key, reaction, (stat.st_mtime_ns, stat.st_size))
+                        changes += 1
+                    except (OSError, ValueError, IndexError, KeyError, StopIteration) as error:
+                        if errors is not None:
+                            errors.append((file, error))
+
+                gone = [(key,) for key in stamps.keys() - present]
+                self.__connection.executemany(f'DELETE FROM {table} WHERE file = ?', gone)
+                changes += len(gone)
+
+            if changes:
+                self.__link()
+                self.__connection.execute('DELETE FROM reactions WHERE id NOT IN (SELECT reaction FROM experiments '
+                                          'UNION SELECT reaction FROM decks UNION SELECT reaction FROM outputs)')
+
+        return changes
+
+    def select(self, projectile: Nuclei | str = None, target: Nuclei | str = None,
+               energy: tuple[float, float] = None, version: str = None) -> list[sqlite3.Row]:
+        '''
+        Rows of the `runs` view, all filters optional
+
+        :return: rows with projectile, target, energy, version, experiment, deck, output, chi2, deck parameters
+                 and the fitted ones prefixed by `fit_`
+        :rtype: list[sqlite3.Row]
+        '''
+        clauses, arguments = [], []
+
+        if projectile is not None:
+            clauses.append('projectile = ?')
+            arguments.append(as_nuclei(projectile).ZAID)
+        if target is not None:
+            clauses.append('target = ?')
+            arguments.append(as_nuclei(target).ZAID)
+        if energy is not None:
+            clauses.append('energy BETWEEN ? AND ?')
+            arguments.extend(energy)
+        if version is not None:
+            clauses.append('version = ?')
+            arguments.append(version)
+
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return self.__connection.execute('SELECT * FROM runs' + where + ' ORDER BY target, projectile, energy', arguments).fetchall()
+
+    def table(self, fitted: bool = False, **filters) -> DatasetTable:
+        '''
+        Selected decks as a training table, labelled by the deck parameters or, with `fitted`,
+        by the potential of the final ECIS search (rows without a report are then left out)
+        '''
+        prefix = 'fit_' if fitted else ''
+        rows = [row for row in self.select(**filters) if row[prefix + LABELS[0]] is not None]
+
+        xs = [[row['projectile'] // 1000, row['projectile'] % 1000, row['target'] // 1000, row['target'] % 1000, row['energy']] for row in rows]
+        ys = [[row[prefix + label] for label in LABELS] for row in rows]
+
+        return DatasetTable(numpy.array(xs, dtype=float).reshape(-1, 5), numpy.array(ys, dtype=float).reshape(-1, len(LABELS)))
+
+    def __reaction(self, reaction: Reaction) -> int:
+        key = (reaction.projectile.ZAID, reaction.target.ZAID, round(reaction.energy, 2))
+        self.__connection.execute('INSERT OR IGNORE INTO reactions (projectile, target, energy) VALUES (?, ?, ?)', key)
+
+        return self.__connection.execute('SELECT id FROM reactions WHERE projectile = ? AND target = ? AND energy = ?', key).fetchone()[0]
+
+    def __link(self) -> None:
+        '''
+        Sets `decks.experiment`: within a reaction and version, decks take the experiment with the same angles first,
+        the rest pair up in order, decks by their `_in`, `_in_2`, ... number and experiments by file name
+        '''
+        groups = {}
+        for row in self.__connection.execute('SELECT file, version, reaction, angles FROM experiments ORDER BY file'):
+            groups.setdefault((row['version'], row['reaction']), ([], []))[0].append((row['file'], row['angles']))
+        for row in self.__connection.execute('SELECT file, version, reaction, angles FROM decks'):
+            groups.setdefault((row['version'], row['reaction']), ([], []))[1].append((row['file'], row['angles']))
+
+        links = []
+        for experiments, decks in groups.values():
+            decks.sort(key=lambda deck: (deck_number(deck[0]), deck[0]))
+            free = list(experiments)
+            unmatched = []
+
+            for deck, angles in decks:
+                match = next((experiment for experiment in free if angles is not None and experiment[1] == angles), None)
+                if match is None:
+                    unmatched.append(deck)
+                else:
+                    free.remove(match)
+                    links.append((match[0], deck))
+
+            links += [(experiment[0], deck) for experiment, deck in zip(free, unmatched)]
+            links += [(None, deck) for deck in unmatched[len(free):]]
+
+        self.__connection.executemany('UPDATE decks SET experiment = ? WHERE file = ?', links)
+
+    def __index(self, table: str, key: str, reaction: Reaction, stamp: tuple[int, int]) -> None:
+        version = next((part for part in key.split(os.sep) if part.startswith('v') and part[1:].isdigit()), None)
+        identifier = self.__reaction(reaction)
+
+        if table == 'experiments':
+            with open_text(reaction.file) as text:
+                buffer = text.read().rstrip().split('\n')
+            start = next(i for i in range(len(buffer)) if 'Angle' in buffer[i]) + 1
+            angles = fingerprint([float(line.split()[0]) for line in buffer[start:]])
+            values = (key, version, identifier, *stamp, buffer[1].strip(), len(buffer) - start, angles)
+
+        elif table == 'decks':
+            with open_text(reaction.file) as text:
+                buffer = text.read().split('\n')
+            try:
+                angles = fingerprint(read_cards(buffer[COUNT + 1:COUNT + 1 + int(buffer[COUNT][2:5])], 1)[:, 0])
+            except (ValueError, IndexError):
+                angles = None
+            values = (key, version, identifier, *stamp, angles, None, *EcisReader().read_potential_parameters(buffer))
+
+        else:
+            report = read_report(reaction.file)
+            before, _, after = key.rpartition(os.sep + 'out')
+            deck = os.path.join(before + os.sep + 'in' + after[:after.rfind(os.sep) + 1], plain_name(os.path.basename(key)).replace('_out', '_in'))
+            deck = os.path.relpath(locate(os.path.join(self.__root, deck)) or os.path.join(self.__root, deck), self.__root)
+            values = (key, version, identifier, os.path.normpath(deck), *stamp, *map(as_sql, (report.chi2, report.chi2_initial, report.reaction)),
+                      int(report.complete), *map(as_sql, report.potential))
+
+        marks = ', '.join('?' * len(values))
+        self.__connection.execute(f'INSERT OR REPLACE INTO {table} VALUES ({marks})', values)
+
+
+def as_sql(value: float) -> float | None:
+    return None if numpy.isnan(value) else float(value)
+
+
+def fingerprint(angles: list[float]) -> str:
+    '''
+    :return: hash of an angle grid to 0.01 deg, the same for an experiment and the decks generated from it
+    :rtype: str
+    '''
+    return hashlib.sha1(','.join(f'{angle:.2f}' for angle in angles).encode()).hexdigest()[:16]
+
+
+def deck_number(file: str) -> int:
+    '''
+    :return: 1 for `27Al+7Li_9.0_in.txt`, 2 for `27Al+7Li_9.0_in_2.txt`, ...
+    :rtype: int
+    '''
+    tail = os.path.splitext(plain_name(os.path.basename(file)))[0].rpartition('_in')[2]
+    return int(tail[1:]) if tail[1:].isdigit() else 1
+
+
+def kind_table(kind: str) -> str:
+    return {'xsections': 'experiments', 'in': 'decks', 'out': 'outputs'}[kind]
+
+
+if __name__ == '__main__':
+    catalog = Catalog('..')
+    print(catalog.update())
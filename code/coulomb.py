@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import math
+import functools
+import numpy
+from nuclei import Nuclei
+
+
+HBARC = 197.32858                   # MeV * fm
+AMU = 931.5016                      # MeV
+FINE_STRUCTURE = 1 / 137.03604      # dimensionless
+E2 = HBARC * FINE_STRUCTURE         # MeV * fm
+
+TINY = 1e-300
+MAX_ITERATIONS = 100000
+
+
+def kinematics(proj: Nuclei, targ: Nuclei, energy: float) -> tuple[float, float, float]:
+    '''
+    Non-relativistic c.m. kinematics with the ECIS 1988 constants
+
+    :return: `2 mu / hbar^2` in 1 / (MeV * fm^2), wave number `k` in 1 / fm, Sommerfeld parameter `eta`
+    :rtype: tuple[float, float, float]
+    '''
+    mass = proj.A * targ.A / (proj.A + targ.A) # amu
+    energy_cm = energy * targ.A / (proj.A + targ.A) # MeV
+    factor = 2 * mass * AMU / HBARC ** 2 # 1 / (MeV * fm^2)
+    k = math.sqrt(factor * energy_cm) # 1 / fm
+    eta = proj.Z * targ.Z * E2 * factor / (2 * k) # dimensionless
+
+    return factor, k, eta
+
+
+def phase_shifts(eta: numpy.ndarray, lmax: int) -> numpy.ndarray:
+    '''
+    Coulomb phase shifts, `sigma_0 = arg Gamma(1 + i eta)` from Stirling's series
+    after shifting the argument by 10 and `sigma_l = sigma_(l-1) + atan(eta / l)`
+
+    :return: `sigma_l` with shape `eta.shape + (lmax + 1,)`
+    :rtype: numpy.ndarray
+    '''
+    eta = numpy.asarray(eta, dtype=float)
+    z = 11.0 + 1j * eta
+    stirling = (z - 0.5) * numpy.log(z) - z + 0.5 * math.log(2 * math.pi) + 1 / (12 * z) - 1 / (360 * z ** 3) + 1 / (1260 * z ** 5)
+    shift = numpy.sum(numpy.arctan2(eta[..., None], numpy.arange(1, 11)), axis=-1)
+
+    steps = numpy.zeros(eta.shape + (lmax + 1,))
+    steps[..., 1:] = numpy.arctan2(eta[..., None], numpy.arange(1, lmax + 1))
+
+    return (stirling.imag - shift)[..., None] + numpy.cumsum(steps, axis=-1)
+
+
+def wave_functions(eta: numpy.ndarray, rho: numpy.ndarray, lmax: int, accuracy: float = 1e-14) -> tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    Regular and irregular Coulomb wave functions by Steed's method (Barnett's COULFG)
+    for every `(eta, rho)` pair at once: CF1 for `F'/F` at `lmax`, downward recurrence of `F`,
+    CF2 for `H+'/H+` at `l = 0`, Wronskian normalisation and upward recurrence of `G`.
+    CF2 converges quickly only outside the turning point, `rho > eta + sqrt(eta^2 + l(l+1))` at `l = 0`.
+
+    :return: `F_l`, `G_l` with shape `broadcast(eta, rho).shape + (lmax + 1,)`
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    '''
+    eta, rho = numpy.broadcast_arrays(numpy.asarray(eta, dtype=float), numpy.asarray(rho, dtype=float))
+    shape = eta.shape
+    eta, rho = eta.ravel(), rho.ravel()
+
+    def S(l: int) -> numpy.ndarray:
+        return l / rho + eta / l
+
+    def R(l: int) -> numpy.ndarray:
+        return numpy.sqrt(1 + (eta / l) ** 2)
+
+    # CF1: f = F'/F at lmax, modified Lentz; converged points keep multiplying by ~1
+    f = S(lmax + 1)
+    f = numpy.where(f == 0, TINY, f)
+    C, D = f.copy(), numpy.zeros_like(f)
+    for j in range(1, MAX_ITERATIONS):
+        a = -R(lmax + j) ** 2
+        b = S(lmax + j) + S(lmax + j + 1)
+        D = b + a * D
+        D = 1 / numpy.where(D == 0, TINY, D)
+        C = b + a / C
+        C = numpy.where(C == 0, TINY, C)
+        delta = C * D
+        f *= delta
+
+        if numpy.all(numpy.abs(delta - 1) < accuracy):
+            break
+
+    # Downward recurrence of the unnormalised F and F'
+    F = numpy.empty((len(rho), lmax + 1))
+    F[:, lmax] = 1e-30
+    Fp = f * F[:, lmax]
+    for l in range(lmax, 0, -1):
+        F[:, l - 1] = (S(l) * F[:, l] + Fp) / R(l)
+        Fp = S(l) * F[:, l - 1] - R(l) * F[:, l]
+
+        large = numpy.abs(F[:, l - 1]) > 1e250
+        if numpy.any(large):
+            F[large, l - 1:] *= 1e-250
+            Fp[large] *= 1e-250
+
+    # CF2: p + iq = H+'/H+ at l = 0, Steed's algorithm
+    a = -eta ** 2 + 1j * eta
+    b = 2 * (rho - eta) + 2j
+    D = 1 / b
+    delta = 1j / rho * a * D
+    pq = 1j * (1 - eta / rho) + delta
+    for j in range(1, MAX_ITERATIONS):
+        if numpy.all(numpy.abs(delta) <= accuracy * numpy.abs(pq)):
+            break
+
+        a = a + 2 * j + 2j * eta
+        b = b + 2j
+        D = 1 / (b + a * D)
+        delta = (b * D - 1) * delta
+        pq += delta
+
+    p, q = pq.real, pq.imag
+    gamma = (Fp / F[:, 0] - p) / q
+    F0 = numpy.copysign(1 / numpy.sqrt(q * (1 + gamma ** 2)), F[:, 0])
+    F *= (F0 / F[:, 0])[:, None]
+
+    # Upward recurrence of G from G_0 = gamma F_0, G_0' = (p gamma - q) F_0
+    G = numpy.empty_like(F)
+    G[:, 0] = gamma * F0
+    Gp = (p * gamma - q) * F0
+    for l in range(lmax):
+        G[:, l + 1] = (S(l + 1) * G[:, l] - Gp) / R(l + 1)
+        Gp = R(l + 1) * G[:, l] - S(l + 1) * G[:, l + 1]
+
+    return F.reshape(shape + (lmax + 1,)), G.reshape(shape + (lmax + 1,))
+
+
+@functools.lru_cache(maxsize=1024)
+def matching_functions(proj: Nuclei, targ: Nuclei, energy: float, radius: float, step: float, lmax: int) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    '''
+    Memoised Coulomb phase shifts and wave functions at the two outermost mesh points
+    `radius - step` and `radius`. Keyed on the projectile and target (`Nuclei` compare by ZAID),
+    lab energy and matching radius, so fits and grid scans over one reaction pay for them once.
+    The returned arrays are shared between callers and therefore read-only.
+
+    :return: `sigma_l` with shape `(lmax + 1,)`, `F_l` and `G_l` with shape `(2, lmax + 1)`
+    :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+    '''
+    _, k, eta = kinematics(proj, targ, energy)
+    rho = k * numpy.array([radius - step, radius])
+
+    sigma = phase_shifts(eta, lmax)
+    F, G = wave_functions(eta, rho, lmax)
+
+    for array in (sigma, F, G):
+        array.flags.writeable = False
+
+    return sigma, F, G
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import math
+import time
+import numpy
+from nuclei import Nuclei
+from coulomb import kinematics, matching_functions
+from partialwaves import PartialWaves
+from opticalsolver import OpticalSolver, Scattering, optical_potential, woods_saxon, woods_saxon_surface
+
+
+class CoupledScattering(Scattering):
+    def __init__(self, angles: numpy.ndarray, xsections: numpy.ndarray, ratios: numpy.ndarray, reaction: numpy.ndarray,
+                 smatrix: numpy.ndarray, inelastic: numpy.ndarray, coupled: numpy.ndarray) -> None:
+        super().__init__(angles, xsections, ratios, reaction, smatrix)
+        self.__inelastic = inelastic
+        self.__coupled = coupled
+
+    @property
+    def inelastic(self) -> numpy.ndarray:
+        '''
+        Angle-integrated cross section of the excited state
+
+        :return: `sigma_inel`, mb
+        :rtype: float | numpy.ndarray
+        '''
+        return self.__inelastic
+
+    @property
+    def coupled(self) -> numpy.ndarray:
+        '''
+        Flux-normalised S-matrix column of the entrance channel for every `J`:
+        index 0 is elastic, the rest are the excited channels `l' = J - lambda, J - lambda + 2, .. J + lambda`
+        (zero where such an `l'` cannot couple to `J`)
+
+        :return: `S_(c, 0)^J` with shape `(J + 1, lambda + 2)`, per set for batched solves
+        :rtype: numpy.ndarray
+        '''
+        return self.__coupled
+
+
+class CoupledChannelsSolver:
+    '''
+    Elastic and inelastic scattering of a spinless projectile on a deformed 0+ target coupled to one
+    excited state of multipolarity `lambda` (the 2+ member of a rotational band or a one-phonon state),
+    with the same (Vr, rv, av, Wv, rw, aw, Wd, rd, ad, rc) parameters and radius convention as `OpticalSolver`.
+
+    Coupling is the first-order deformed optical potential, `-beta * R_i * dU_i/dr` for each Woods-Saxon term;
+    the rotational model adds the reorientation of the excited state. Coulomb excitation is left out,
+    which is fair for the light targets of our dataset.
+
+    For every total `J` the `lambda + 2` channels form one block and all blocks of all parameter sets
+    are advanced together by the matrix Numerov recurrence.
+    '''
+    CHUNK = OpticalSolver.CHUNK
+
+    def __init__(self, proj: Nuclei, targ: Nuclei, energy: float, excitation: float, deformation: float,
+                 multipolarity: int = 2, rotational: bool = True, angles: numpy.ndarray = None,
+                 step: float = 0.05, radius: float = None, lmax: int = None) -> None:
+        self.__proj = proj
+        self.__targ = targ
+        self.__energy = energy
+        self.__excitation = excitation
+        self.__deformation = deformation
+        self.__multipolarity = multipolarity
+        self.__rotational = rotational
+        self.__angles = numpy.arange(1.0, 180.0, 1.0) if angles is None else numpy.asarray(angles, dtype=float)
+
+        self.__factor, self.__k, self.__eta = kinematics(proj, targ, energy)
+
+        # The excited channel as an elastic one at the lab energy that leaves the same c.m. energy
+        energy_cm = energy * targ.A / (proj.A + targ.A)
+        if excitation >= energy_cm:
+            raise ValueError(f'Excited state at {excitation} MeV is closed at E_cm = {round(energy_cm, 3)} MeV')
+        channel_energy = energy - excitation * (proj.A + targ.A) / targ.A
+        _, k_exc, eta_exc = kinematics(proj, targ, channel_energy)
+
+        if radius is None:
+            radius = max(1.6 * self.reduced_radius + 12.0, 2.2 * eta_exc / k_exc)
+
+        self.__step = step
+        self.__points = int(math.ceil(radius / step))
+        self.__radius = self.__points * step
+        self.__r = step * numpy.arange(self.__points + 1) # fm
+
+        if lmax is None:
+            lmax = int(self.__k * self.__radius) + 10
+
+        # Channel layout, (J, channel): elastic l = J, then the excited channels
+        J = numpy.arange(lmax + 1)[:, None]
+        l = numpy.concatenate([J, J - multipolarity + 2 * numpy.arange(multipolarity + 1)[None, :]], axis=1)
+        self.__valid = (l >= 0) & (numpy.abs(l - multipolarity) <= J) & (J <= l + multipolarity)
+        self.__valid[:, 0] = True
+        self.__l = numpy.where(self.__valid, l, J)
+        self.__ks = numpy.array([self.__k] + [k_exc] * (multipolarity + 1))
+
+        spins = [0] + [multipolarity] * (multipolarity + 1)
+        self.__geometry = numpy.zeros(self.__l.shape + (len(spins),))
+        for j in range(lmax + 1):
+            for a in range(len(spins)):
+                for b in range(len(spins)):
+                    reorientation = spins[a] == spins[b] == multipolarity
+                    if (spins[a] != spins[b] or reorientation and rotational) and self.__valid[j, a] and self.__valid[j, b]:
+                        self.__geometry[j, a, b] = coupling(self.__l[j, a], spins[a], self.__l[j, b], spins[b], j, multipolarity)
+
+        r = self.__r[1:, None, None, None]
+        self.__barrier = self.__l[None, None] * (self.__l[None, None] + 1) / r ** 2 - self.__ks ** 2 # point, 1, J, channel
+
+        # Coulomb functions of both channels at the two outermost mesh points, gathered per (J, channel)
+        lmax_channels = lmax + multipolarity
+        sigma, F, G = matching_functions(proj, targ, energy, self.__radius, step, lmax_channels)
+        _, F_exc, G_exc = matching_functions(proj, targ, channel_energy, self.__radius, step, lmax_channels)
+        F = numpy.concatenate([F[:, self.__l[:, :1]], F_exc[:, self.__l[:, 1:]]], axis=2)
+        G = numpy.concatenate([G[:, self.__l[:, :1]], G_exc[:, self.__l[:, 1:]]], axis=2)
+        self.__incoming, self.__outgoing = G - 1j * F, G + 1j * F # H-, H+ with shape (2, J, channel)
+
+        self.__waves = PartialWaves(self.__k, self.__eta, lmax, self.__angles, sigma)
+
+    @property
+    def projectile(self) -> Nuclei:
+        return self.__proj
+
+    @property
+    def target(self) -> Nuclei:
+        return self.__targ
+
+    @property
+    def energy(self) -> float:
+        return self.__energy
+
+    @property
+    def excitation(self) -> float:
+        return self.__excitation
+
+    @property
+    def deformation(self) -> float:
+        return self.__deformation
+
+    @property
+    def angles(self) -> numpy.ndarray:
+        return self.__angles.copy()
+
+    @property
+    def reduced_radius(self) -> float:
+        return math.pow(self.__targ.A, 1/3) + math.pow(self.__proj.A, 1/3)
+
+    @property
+    def matching_radius(self) -> float:
+        return self.__radius
+
+    @property
+    def lmax(self) -> int:
+        return len(self.__l) - 1
+
+    def solve(self, params: numpy.ndarray) -> CoupledScattering:
+        batch = self.solve_batch(numpy.asarray(params, dtype=float)[None, :])
+        return CoupledScattering(batch.angles, batch.xsections[0], batch.ratios[0], float(batch.reaction[0]),
+                                 batch.smatrix[0], float(batch.inelastic[0]), batch.coupled[0])
+
+    def solve_batch(self, params: numpy.ndarray, vectorized: bool = True) -> CoupledScattering:
+        '''
+        Solves the coupled equations for many parameter sets at once.
+        `vectorized = False` integrates one `J` block at a time instead, for reference and timing.
+
+        :return: elastic cross sections with shape `(N, n_angles)`, reaction and inelastic cross sections with shape `(N,)`
+        :rtype: CoupledScattering
+        '''
+        params = numpy.atleast_2d(numpy.asarray(params, dtype=float))
+
+        if vectorized:
+            block = len(self.__l) * self.__points * self.__ks.size ** 2
+            chunk = max(1, self.CHUNK // block)
+            coupled = numpy.concatenate([self.__integrate(params[i:i + chunk]) for i in range(0, len(params), chunk)])
+        else:
+            coupled = numpy.array([[self.__integrate(params[n:n + 1], j)[0, 0] for j in range(len(self.__l))] for n in range(len(params))])
+
+        coupled = numpy.where(self.__valid, coupled, 0.0)
+        smatrix = coupled[:, :, 0]
+
+        xsections, ratios = self.__waves.cross_sections(smatrix)
+        reaction = self.__waves.reaction_cross_section(smatrix)
+
+        J = numpy.arange(len(self.__l))
+        inelastic = 10 * math.pi / self.__k ** 2 * numpy.sum((2 * J + 1) * numpy.sum(numpy.abs(coupled[:, :, 1:]) ** 2, axis=-1), axis=-1)
+
+        return CoupledScattering(self.__angles.copy(), xsections, ratios, reaction, smatrix, inelastic, coupled)
+
+    def __integrate(self, params: numpy.ndarray, j: int = None) -> numpy.ndarray:
+        blocks = slice(None) if j is None else slice(j, j + 1)
+        h, channels = self.__step, self.__ks.size
+        identity = numpy.eye(channels)
+
+        potential = self.__factor * optical_potential(self.__r, self.reduced_radius, self.__proj.Z * self.__targ.Z, params)[:, 1:].T
+        form = self.__factor * deformed_form_factor(self.__r, self.reduced_radius, self.__deformation, params)[:, 1:].T
+
+        # g(r) matrices laid out as (point, set, J, channel, channel)
+        g = form[:, :, None, None, None] * self.__geometry[None, None, blocks]
+        diagonal = numpy.einsum('...ii->...i', g)
+        diagonal += self.__barrier[:, :, blocks] + potential[:, :, None, None]
+
+        w = identity - h ** 2 / 12 * g
+        inverse = numpy.linalg.inv(w)
+        c = 12 * inverse - 10 * identity
+
+        start = numpy.where(self.__l[blocks] == 1, -1 / 6, 0.0)
+        y_prev = numpy.broadcast_to(start[..., None] * identity, c.shape[1:]).astype(complex)
+        y_curr = w[0]
+
+        for n in range(1, self.__points):
+            y_prev, y_curr = y_curr, c[n - 1] @ y_curr - y_prev
+
+            # Re-basing on the current solution keeps the columns independent while closed-off channels grow
+            if n % 16 == 0:
+                rebase = numpy.linalg.inv(y_curr)
+                y_prev, y_curr = y_prev @ rebase, numpy.broadcast_to(identity, y_curr.shape).astype(complex)
+
+        ua = inverse[-2] @ y_prev
+        ub = inverse[-1] @ y_curr
+
+        # u(r) A = H-(r) - H+(r) S at both points, solved for the entrance column of S
+        Ia, Ib = self.__incoming[0, blocks], self.__incoming[1, blocks]
+        Oa, Ob = self.__outgoing[0, blocks], self.__outgoing[1, blocks]
+        ratio = ub @ numpy.linalg.inv(ua)
+        A = Ob[..., None] * identity - ratio * Oa[..., None, :]
+        B = Ib[..., :1] * identity[0] - ratio[..., 0] * Ia[..., :1]
+        S = numpy.linalg.solve(A, B[..., None])[..., 0]
+
+        return S * numpy.sqrt(self.__ks / self.__k)
+
+
+def deformed_form_factor(r: numpy.ndarray, R: float, beta: float, params: numpy.ndarray) -> numpy.ndarray:
+    '''
+    First-order coupling form factor of the deformed nuclear potential, `-beta * R_i * dU_i/dr`
+    summed over the real volume, imaginary volume and imaginary surface terms
+
+    :return: form factor with one row per parameter set, MeV
+    :rtype: numpy.ndarray
+    '''
+    params = numpy.atleast_2d(numpy.asarray(params, dtype=float))
+    Vr, rv, av, Wv, rw, aw, Wd, rd, ad, _ = params.T[:, :, None]
+    r = r[None, :]
+
+    def volume(R: numpy.ndarray, a: numpy.ndarray) -> numpy.ndarray:
+        f = woods_saxon(r, R, a)
+        return -f * (1 - f) / a
+
+    def surface(R: numpy.ndarray, a: numpy.ndarray) -> numpy.ndarray:
+        return -2 * woods_saxon_surface(r, R, a) * numpy.tanh((r - R) / (2 * a)) / (2 * a)
+
+    derivative = -Vr * rv * volume(rv * R, av)
+    derivative = derivative - 1j * Wv * rw * volume(rw * R, aw)
+    derivative = derivative - 4j * Wd * rd * surface(rd * R, ad)
+
+    return -beta * R * derivative
+
+
+def coupling(l: int, I: int, lp: int, Ip: int, J: int, multipolarity: int) -> float:
+    '''
+    Geometry of `<(l I) J | Y_lambda(r) . Y_lambda(axis) | (l' I') J>` for a spinless projectile
+    and a K = 0 band, scaled so that the 0+ -> lambda, J = 0 element equals `1 / sqrt(4 pi)`
+
+    :return: coupling coefficient
+    :rtype: float
+    '''
+    lam = multipolarity
+    phase = -1 if (l + lp + J) % 2 else 1
+    norm = math.sqrt((2 * lam + 1) * (2 * l + 1) * (2 * lp + 1) * (2 * I + 1) * (2 * Ip + 1) / (4 * math.pi))
+
+    return phase * norm * wigner_3j_zero(l, lam, lp) * wigner_3j_zero(I, lam, Ip) * wigner_6j(l, I, J, Ip, lp, lam)
+
+
+def wigner_3j_zero(a: int, b: int, c: int) -> float:
+    '''
+    Wigner 3j symbol with zero projections, `(a b c; 0 0 0)`
+    '''
+    if (a + b + c) % 2 or not triangle(a, b, c):
+        return 0.0
+
+    g = (a + b + c) // 2
+    f = math.factorial
+    value = math.sqrt(f(2 * g - 2 * a) * f(2 * g - 2 * b) * f(2 * g - 2 * c) / f(2 * g + 1)) * f(g) / (f(g - a) * f(g - b) * f(g - c))
+
+    return -value if g % 2 else value
+
+
+def wigner_6j(j1: int, j2: int, j3: int, j4: int, j5: int, j6: int) -> float:
+    '''
+    Wigner 6j symbol `{j1 j2 j3; j4 j5 j6}` of integer arguments by Racah's formula
+    '''
+    triads = [(j1, j2, j3), (j1, j5, j6), (j4, j2, j6), (j4, j5, j3)]
+    if not all(triangle(*triad) for triad in triads):
+        return 0.0
+
+    f = math.factorial
+
+    def delta(a: int, b: int, c: int) -> float:
+        return math.sqrt(f(a + b - c) * f(a - b + c) * f(-a + b + c) / f(a + b + c + 1))
+
+    lower = max(sum(triad) for triad in triads)
+    upper = min(j1 + j2 + j4 + j5, j2 + j3 + j5 + j6, j3 + j1 + j6 + j4)
+
+    total = 0.0
+    for t in range(lower, upper + 1):
+        denominator = math.prod(f(t - sum(triad)) for triad in triads)
+        denominator *= f(j1 + j2 + j4 + j5 - t) * f(j2 + j3 + j5 + j6 - t) * f(j3 + j1 + j6 + j4 - t)
+        total += (-1) ** t * f(t + 1) / denominator
+
+    return math.prod(delta(*triad) for triad in triads) * total
+
+
+def triangle(a: int, b: int, c: int) -> bool:
+    return abs(a - b) <= c <= a + b
+
+
+def benchmark(solver: CoupledChannelsSolver, params: numpy.ndarray) -> float:
+    '''
+    Wall time of the per-`J` block integration over the all-blocks-at-once one
+
+    :return: speed-up factor
+    :rtype: float
+    '''
+    start = time.perf_counter()
+    solver.solve_batch(params, vectorized=False)
+    loops = time.perf_counter() - start
+
+    start = time.perf_counter()
+    solver.solve_batch(params)
+    return loops / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    pass
@@ -1,8 +1,15 @@
 from __future__ import annotations
 
 import os
+import hashlib
+import builtins
 import numpy
-from ecisreader import EcisReader
+from typing import Callable, Iterator
+from ecisreader import EcisReader, walk
+
+
+# `gather` caches live outside the data trees, one archive per gathered directory
+CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'gopenn')
 
 
 class Dataset:
@@ -19,32 +26,269 @@ class Dataset:
         return self.__ys.copy()
     
     @staticmethod
-    def gather(path: str) -> list[Dataset]:
-        ecr = EcisReader()
-        datasets = []
-        ecises = []
+    def gather(path: str, cache: str = None, workers: int = None, progress: Callable[[int, int, str], None] = None,
+               errors: list[tuple[str, Exception]] = None) -> list[Dataset]:
+        '''
+        Datasets of every ECIS input under `path`, in `walk` order. Parsed inputs are kept in the `cache` archive
+        (`cache_file(path)` by default, `''` disables it) together with the mtime and size of every source,
+        so a warm call only re-reads new or modified files; those are parsed by `EcisReader.read_many`.
+        `progress(done, total, file)` follows the parsed files; files that fail to parse are skipped
+        and appended to `errors` as `(file, exception)`, from the cache as well until they change.
+        A cache that cannot be written is left alone, as caching is only an optimisation.
+        '''
+        if cache is None:
+            cache = cache_file(path)
+
+        entries = read_cache(cache) if cache else {}
+        fresh, stale = {}, []
+        keys = []
+
+        for file in walk(path):
+            key = os.path.relpath(file, path)
+            stat = os.stat(file)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            keys.append(key)
 
-        stack = os.listdir(path)
-        stack = [path + '\\' + stack[i] for i in range(len(stack))]
+            if key in entries and entries[key][0] == stamp:
+                fresh[key] = entries[key]
+                if fresh[key][1] is None and errors is not None:
+                    errors.append((file, fresh[key][2]))
+            else:
+                stale.append((file, stamp))
 
-        while len(stack) != 0:
-            current = stack.pop()
+        stamps = dict(stale)
+        for done, (file, result) in enumerate(EcisReader().read_many(stamps, workers) if stamps else (), 1):
+            if isinstance(result, Exception):
+                fresh[os.path.relpath(file, path)] = (stamps[file], None, result)
+                if errors is not None:
+                    errors.append((file, result))
+            else:
+                inputs, outputs = result
+                fresh[os.path.relpath(file, path)] = (stamps[file], inputs, numpy.asarray(outputs, dtype=float))
 
-            if os.path.isfile(current):
-                ecises.append(current)
+            if progress is not None:
+                progress(done, len(stamps), file)
 
-            if os.path.isdir(current):
-                inside = os.listdir(current)
-                inside = [current + '\\' + inside[i] for i in range(len(inside))]
-                stack.extend(inside)
+        datasets = [Dataset(fresh[key][1], fresh[key][2]) for key in keys if key in fresh and fresh[key][1] is not None]
 
-        for j in range(len(ecises)):
-            inputs, outputs = ecr.read(ecises[j])
-            datasets.append(Dataset(inputs, outputs))
-            print(ecises[j])
+        changed = fresh.keys() != entries.keys() or any(fresh[key] is not entries[key] for key in fresh)
+        if cache and changed:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(cache)), exist_ok=True)
+                write_cache(cache, fresh)
+            except OSError:
+                pass
 
         return datasets
 
+    @staticmethod
+    def ingest(path: str, workers: int = None, progress: Callable[[int, int, str], None] = None,
+               errors: list[tuple[str, Exception]] = None) -> Iterator[Dataset]:
+        '''
+        Uncached counterpart of `gather` that yields datasets as the pool finishes them, in no particular order;
+        `total` of `progress` is 0, since files are streamed to the pool while the tree is still being walked
+        '''
+        for done, (file, result) in enumerate(EcisReader().read_many(walk(path), workers), 1):
+            if progress is not None:
+                progress(done, 0, file)
+
+            if isinstance(result, Exception):
+                if errors is not None:
+                    errors.append((file, result))
+                continue
+
+            yield Dataset(*result)
+
+    @staticmethod
+    def stream(path: str) -> Iterator[Dataset]:
+        '''
+        Datasets of the synthetic shards under `path`, one shard in memory at a time
+        '''
+        shards = sorted(name for name in os.listdir(path) if name.startswith('shard_') and name.endswith('.npz'))
+
+        for name in shards:
+            with numpy.load(os.path.join(path, name)) as shard:
+                xs, ys = shard['xs'], shard['ys']
+
+            for i in range(len(xs)):
+                yield Dataset(xs[i], ys[i])
+
+
+class DatasetTable:
+    '''
+    Struct-of-arrays counterpart of `list[Dataset]`: inputs and labels of all reactions in two contiguous
+    read-only arrays with named columns. Labels shorter than `LABELS` (`read_optical_parameters` drops zeros)
+    are padded with NaN and left out of `labelled`. Slicing returns views, masks and index arrays return new tables.
+    '''
+    INPUTS = ('Zp', 'Ap', 'Zt', 'At', 'E')
+    LABELS = ('Vr', 'rv', 'av', 'Wv', 'rw', 'aw', 'Wd', 'rd', 'ad', 'rc')
+
+    def __init__(self, xs: numpy.ndarray, ys: numpy.ndarray) -> None:
+        self.__xs = numpy.ascontiguousarray(xs, dtype=float).reshape(-1, len(self.INPUTS))
+        self.__ys = numpy.ascontiguousarray(ys, dtype=float)
+        self.__xs.flags.writeable = False
+        self.__ys.flags.writeable = False
+
+    @staticmethod
+    def from_datasets(datasets: list[Dataset]) -> DatasetTable:
+        width = max([len(DatasetTable.LABELS)] + [len(dataset.ys) for dataset in datasets])
+        xs = numpy.array([dataset.xs for dataset in datasets], dtype=float).reshape(-1, len(DatasetTable.INPUTS))
+        ys = numpy.full((len(datasets), width), numpy.nan)
+
+        for i, dataset in enumerate(datasets):
+            labels = dataset.ys
+            ys[i, :len(labels)] = labels
+
+        return DatasetTable(xs, ys)
+
+    @staticmethod
+    def gather(path: str, **kwargs) -> DatasetTable:
+        '''
+        `Dataset.gather` of `path` as one table; keyword arguments are passed through
+        '''
+        return DatasetTable.from_datasets(Dataset.gather(path, **kwargs))
+
+    @property
+    def xs(self) -> numpy.ndarray:
+        return self.__xs
+
+    @property
+    def ys(self) -> numpy.ndarray:
+        return self.__ys
+
+    @property
+    def zaid(self) -> numpy.ndarray:
+        '''
+        :return: target ZAID of every row
+        :rtype: numpy.ndarray
+        '''
+        return 1000 * self['Zt'] + self['At']
+
+    @property
+    def labelled(self) -> numpy.ndarray:
+        '''
+        :return: mask of the rows with a complete label
+        :rtype: numpy.ndarray
+        '''
+        return numpy.all(numpy.isfinite(self.__ys), axis=1)
+
+    def __len__(self) -> int:
+        return len(self.__xs)
+
+    def __getitem__(self, key: str | slice | numpy.ndarray) -> numpy.ndarray | DatasetTable:
+        '''
+        A column view by name, or the rows selected by a slice, boolean mask or index array
+        '''
+        if isinstance(key, str):
+            if key in self.INPUTS:
+                return self.__xs[:, self.INPUTS.index(key)]
+            if key not in self.LABELS[:self.__ys.shape[1]]:
+                raise KeyError(f'no column {key!r} in a table with labels {self.LABELS[:self.__ys.shape[1]]}')
+            return self.__ys[:, self.LABELS.index(key)]
+
+        return DatasetTable(self.__xs[key], self.__ys[key])
+
+    def __iter__(self) -> Iterator[Dataset]:
+        return (self.row(i) for i in range(len(self)))
+
+    def row(self, i: int) -> Dataset:
+        '''
+        Row `i` for callers of `Dataset`, labels without the NaN padding
+        '''
+        ys = self.__ys[i]
+        return Dataset(self.__xs[i], ys[numpy.isfinite(ys)])
+
+    def select(self, **columns: float | tuple[float, float]) -> DatasetTable:
+        '''
+        Rows whose named columns equal a value or fall into an inclusive `(low, high)` range,
+        e.g. `select(Ap=7, At=(2, 16))`
+        '''
+        mask = numpy.ones(len(self), dtype=bool)
+
+        for name, value in columns.items():
+            low, high = value if isinstance(value, tuple) else (value, value)
+            column = self[name]
+            mask &= (column >= low) & (column <= high)
+
+        return self[mask]
+
+    def sort_by_zaid(self) -> DatasetTable:
+        '''
+        Rows ordered by target ZAID, then projectile ZAID, then energy
+        '''
+        order = numpy.lexsort((self['E'], 1000 * self['Zp'] + self['Ap'], self.zaid))
+        return self[order]
+
+    def split(self, test_size: float = 0.2, seed: int = None) -> tuple[DatasetTable, DatasetTable]:
+        '''
+        Random train and test tables
+
+        :return: train, test
+        :rtype: tuple[DatasetTable, DatasetTable]
+        '''
+        order = numpy.random.default_rng(seed).permutation(len(self))
+        test = int(round(test_size * len(self)))
+
+        return self[order[test:]], self[order[:test]]
+
+
+def cache_file(path: str) -> str:
+    '''
+    :return: default `gather` cache of the directory `path`, named by a hash of its absolute path under `CACHE`
+    :rtype: str
+    '''
+    return os.path.join(CACHE, hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:32] + '.npz')
+
+
+def read_cache(file: str) -> dict[str, tuple[tuple[int, int], numpy.ndarray | None, numpy.ndarray | Exception]]:
+    '''
+    Entries of a `gather` cache keyed by source path relative to the gathered directory;
+    labels are stored flat with offsets, since their length varies. Files that failed to parse
+    come back as `((mtime_ns, size), None, exception)`.
+
+    :return: `{path: ((mtime_ns, size), xs, ys)}`, empty when the archive is missing or unreadable
+    :rtype: dict
+    '''
+    try:
+        with numpy.load(file) as archive:
+            files, stamps = archive['files'], archive['stamps']
+            xs, ys, offsets = archive['xs'], archive['ys'], archive['offsets']
+            failed, failed_stamps, failures = archive['failed'], archive['failed_stamps'], archive['failures']
+    except (OSError, KeyError, ValueError):
+        return {}
+
+    entries = {str(files[i]): ((int(stamps[i, 0]), int(stamps[i, 1])), xs[i], ys[offsets[i]:offsets[i + 1]]) for i in range(len(files))}
+    for i in range(len(failed)):
+        kind, _, message = str(failures[i]).partition(': ')
+        error = getattr(builtins, kind, None)
+        error = error(message) if isinstance(error, type) and issubclass(error, Exception) else RuntimeError(str(failures[i]))
+        entries[str(failed[i])] = ((int(failed_stamps[i, 0]), int(failed_stamps[i, 1])), None, error)
+
+    return entries
+
+
+def write_cache(file: str, entries: dict[str, tuple[tuple[int, int], numpy.ndarray | None, numpy.ndarray | Exception]]) -> None:
+    failed = [key for key in entries if entries[key][1] is None]
+    files = [key for key in entries if entries[key][1] is not None]
+    lengths = [len(entries[key][2]) for key in files]
+
+    columns = {
+        'files': numpy.array(files, dtype=str),
+        'stamps': numpy.array([entries[key][0] for key in files], dtype=numpy.int64).reshape(-1, 2),
+        'xs': numpy.array([entries[key][1] for key in files], dtype=float).reshape(-1, 5),
+        'ys': numpy.concatenate([entries[key][2] for key in files]) if files else numpy.empty(0),
+        'offsets': numpy.concatenate([[0], numpy.cumsum(lengths, dtype=numpy.int64)]),
+        'failed': numpy.array(failed, dtype=str),
+        'failed_stamps': numpy.array([entries[key][0] for key in failed], dtype=numpy.int64).reshape(-1, 2),
+        'failures': numpy.array([f'{type(entries[key][2]).__name__}: {entries[key][2]}' for key in failed], dtype=str)
+    }
+
+    # Written under a temporary name first, so an interrupted run never leaves a truncated cache
+    temporary = f'{file}.{os.getpid()}.part'
+    with open(temporary, 'wb') as archive:
+        numpy.savez(archive, **columns)
+    os.replace(temporary, file)
+
 
 if __name__ == "__main__":
-    Dataset.gather('ecis\\v1\\in')
+    Dataset.gather(os.path.join('ecis', 'v1', 'in'), progress=lambda done, total, file: print(file))
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import os
+import time
+import shutil
+import hashlib
+import sqlite3
+import threading
+import numpy
+from ecisdeck import EcisDeck, INFORMATION, OPTICALS, COUNT
+from storage import copy_member
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY, size INTEGER, seconds REAL, used REAL, hits INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+'''
+
+
+class CacheStats:
+    '''
+    What a `ResultCache` did since it was opened; `saved` sums the ECIS run times of the reports served
+    '''
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.saved = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __repr__(self) -> str:
+        return (f'CacheStats(hits={self.hits}, misses={self.misses}, stores={self.stores}, '
+                f'evictions={self.evictions}, saved={self.saved:.1f} s)')
+
+
+class ResultCache:
+    '''
+    ECIS reports keyed by `deck_key` and the executable that ran the deck, so a deck run before by the same
+    ECIS, in any tree or fitting session, is answered without running it again. Reports are kept xz-compressed under `path`, indexed by `index.sqlite` with their size,
+    run time and last use; once they take more than `capacity` bytes, the least recently used go first.
+    Safe to share between the threads of an `EcisRunner`.
+
+        runner = EcisRunner(cache=ResultCache(os.path.expanduser('~/.cache/ecis')))
+    '''
+    def __init__(self, path: str, capacity: int = 1 << 30) -> None:
+        os.makedirs(path, exist_ok=True)
+
+        self.__path = path
+        self.__capacity = capacity
+        self.__stats = CacheStats()
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(os.path.join(path, 'index.sqlite'), check_same_thread=False)
+        self.__connection.executescript(SCHEMA)
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.__stats
+
+    @property
+    def size(self) -> int:
+        '''
+        :return: bytes taken by the stored reports
+        :rtype: int
+        '''
+        with self.__lock:
+            return self.__connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return self.__connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def __contains__(self, key: str) -> bool:
+        with self.__lock:
+            return self.__connection.execute('SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone() is not None
+
+    def file(self, key: str) -> str:
+        return os.path.join(self.__path, key[:2], key + '.txt.xz')
+
+    def get(self, key: str, output: str) -> bool:
+        '''
+        Copies the report stored under `key` to `output`, compressed by its suffix
+
+        :return: whether there was one
+        :rtype: bool
+        '''
+        with self.__lock:
+            row = self.__connection.execute('SELECT seconds FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.__stats.misses += 1
+                return False
+
+            with self.__connection:
+                self.__connection.execute('UPDATE entries SET used = ?, hits = hits + 1 WHERE key = ?', (time.time(), key))
+
+        # Copied outside the lock so hits of many runner threads decompress at once; a report evicted meanwhile is a miss
+        try:
+            copy_member(self.file(key), output)
+        except FileNotFoundError:
+            with self.__lock:
+                self.__stats.misses += 1
+            return False
+
+        with self.__lock:
+            self.__stats.hits += 1
+            self.__stats.saved += row[0]
+
+        return True
+
+    def put(self, key: str, report: str, seconds: float) -> None:
+        '''
+        Stores the report file `report` of a run that took `seconds`, then evicts down to `capacity`
+        '''
+        copy_member(report, self.file(key))
+        size = os.path.getsize(self.file(key))
+
+        with self.__lock, self.__connection:
+            self.__connection.execute('INSERT OR REPLACE INTO entries (key, size, seconds, used) VALUES (?, ?, ?, ?)',
+                                      (key, size, seconds, time.time()))
+            self.__stats.stores += 1
+
+            total = self.__connection.execute('SELECT SUM(size) FROM entries').fetchone()[0]
+            for old, length in self.__connection.execute('SELECT key, size FROM entries ORDER BY used').fetchall():
+                if total <= self.__capacity:
+                    break
+
+                self.__connection.execute('DELETE FROM entries WHERE key = ?', (old,))
+                if os.path.isfile(self.file(old)):
+                    os.remove(self.file(old))
+
+                total -= length
+                self.__stats.evictions += 1
+
+    def close(self) -> None:
+        self.__connection.close()
+
+
+def executable_key(command: list[str]) -> str:
+    '''
+    What tells one ECIS from another: the command with the program, and the script an interpreter runs,
+    resolved on `PATH` and stamped with their size and mtime, so a rebuilt ECIS or a stand-in such as
+    `fakeecis.py` never shares reports with another
+
+    :return: text to mix into `deck_key`
+    :rtype: str
+    '''
+    parts = list(command)
+    for i, part in enumerate(parts[:2]):
+        resolved = shutil.which(part) if os.sep not in part else part
+        if resolved is not None and os.path.isfile(resolved):
+            stat = os.stat(resolved)
+            parts[i] = f'{os.path.realpath(resolved)}@{stat.st_size}:{stat.st_mtime_ns}'
+
+    return '\0'.join(parts)
+
+
+def deck_key(deck: str | EcisDeck, executable: str = '') -> str | None:
+    '''
+    Hash of what ECIS computes from a deck: the control cards without trailing blanks and the numbers of
+    the information, optical and angular distribution cards as ECIS reads them, so `20.00` and `20.000`
+    or a blank field and `0.0` give the same key. The title, a comment ECIS only echoes, is left out;
+    `executable`, an `executable_key`, keeps the reports of different programs apart.
+
+    :return: SHA-256 hex digest, `None` for a deck that does not parse
+    :rtype: str | None
+    '''
+    try:
+        deck = EcisDeck.parse(deck) if isinstance(deck, str) else deck
+    except (ValueError, IndexError):
+        return None
+
+    lines = deck.lines
+    stop = COUNT + 1 + len(deck.xsections)
+    cards = [line.rstrip() for line in lines[1:INFORMATION] + lines[INFORMATION + 1:OPTICALS.start]
+             + lines[OPTICALS.stop:COUNT] + (lines[COUNT][:2] + lines[COUNT][5:],) + lines[stop:]]
+
+    digest = hashlib.sha256(executable.encode() + b'\0' + '\n'.join(cards).rstrip('\n').encode())
+    for numbers in (deck.information, deck.opticals, deck.xsections):
+        digest.update(numpy.asarray(numbers.shape, dtype='<i8').tobytes())
+        digest.update((numbers + 0.0).astype('<f8').tobytes())
+
+    return digest.hexdigest()
+
+
+if __name__ == '__main__':
+    pass
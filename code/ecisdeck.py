@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import numpy
+from typing import Iterator
+from nuclei import Nuclei
+from storage import open_text
+
+
+# Card layout of the decks `EcisGenerator` writes: title, control cards, the information card,
+# seven optical potential cards (real/imaginary volume, surface, spin-orbit, Coulomb), the angle grid
+# and search cards, the `T0` card with the number of measured angles and the angular distribution
+INFORMATION = 5
+OPTICALS = slice(8, 15)
+COUNT = 18
+WIDTH = 10
+OPTICAL = '%-10.3f'
+
+SETTINGS = [
+    'TFFFFFFFFFFFFFFTFFFFFFFFTTFTFFTTFFFFFFFFFFFF',
+    'FFTTFTFFFFFFFFFFFFFFTFFTFFFFFFFFFFFFFFFFFFFF',
+    '1    30                  6',
+    ''
+]
+SEARCH = [
+    '0.01'.ljust(WIDTH) * 3,
+    '1    2    3    ',
+    'FIN'
+]
+
+# Cells of the optical cards holding (Vr, rv, av, Wv, rw, aw, Wd, rd, ad, rc)
+POTENTIAL = (numpy.array([0, 0, 0, 1, 1, 1, 3, 3, 3, 6]), numpy.array([0, 1, 2, 0, 1, 2, 0, 1, 2, 0]))
+
+
+class EcisDeck:
+    '''
+    An ECIS input deck as typed fields over its own card images. Numbers are read as ECIS reads them,
+    in fixed fields of `WIDTH` columns (a cross section that overruns its field eats into the uncertainty):
+
+        information     (target spin, lab energy, projectile spin, projectile mass, target mass, Zp * Zt)
+        opticals        7 x 3 (depth, reduced radius, diffuseness) cards, Coulomb radius first of the last
+        potential       (Vr, rv, av, Wv, rw, aw, Wd, rd, ad, rc) cells of `opticals`
+        xsections       rows of (angle, sigma in mb / sr, uncertainty in %)
+
+    Cards not assigned since parsing keep their original text, so `text` returns a parsed deck byte for byte;
+    assigning a field re-formats only the cards whose values changed. `variants` emits decks for many
+    potentials of one reaction from a template compiled once.
+
+        deck = EcisDeck.read('27Al+7Li_9.0_in.txt')
+        deck.potential = fitted
+        deck.write('27Al+7Li_9.0_in_2.txt')
+    '''
+    def __init__(self, lines: list[str]) -> None:
+        count = int(lines[COUNT][2:5])
+
+        self.__lines = lines
+        self.__information = read_cards(lines[INFORMATION:INFORMATION + 1], 6)[0]
+        self.__opticals = read_cards(lines[OPTICALS], 3)
+        self.__xsections = read_cards(lines[COUNT + 1:COUNT + 1 + count], 3)
+
+        for array in (self.__information, self.__opticals, self.__xsections):
+            array.flags.writeable = False
+
+    @staticmethod
+    def parse(text: str) -> EcisDeck:
+        return EcisDeck(text.split('\n'))
+
+    @staticmethod
+    def read(file: str) -> EcisDeck:
+        with open_text(file) as text:
+            return EcisDeck.parse(text.read())
+
+    @staticmethod
+    def create(beam: Nuclei, target: Nuclei, energy: float, opticals: list[list[float]],
+               xsections: tuple[list[float], list[float], list[float]]) -> EcisDeck:
+        '''
+        Deck of one reaction in the layout `EcisGenerator` writes, `opticals` as `EcisGenerator.create_sample` returns them
+        '''
+        information = [0.0, energy, 0.0, float(beam.A), float(target.A), float(beam.Z * target.Z)]
+        lines = [f'{target.name} + {beam.name} = {target.name} + {beam.name} E = {round(energy, 2)} MeV']
+
+        lines += SETTINGS
+        lines += [''.join(numpy.char.ljust(format_column(information, 2, WIDTH), WIDTH))]
+        lines += ['0    0    0    0', '0.0']
+        lines += [OPTICAL * 3 % tuple(card) for card in opticals]
+        lines += ['', '1.0'.ljust(WIDTH) + '1.0'.ljust(WIDTH) + '179.0'.ljust(WIDTH), '1    2    6    20   ']
+        lines += ['T0' + str(len(xsections[0])).rjust(3) + '1'.rjust(5)]
+        lines += format_table(numpy.array(xsections, dtype=float).T.reshape(-1, 3))
+        lines += SEARCH
+
+        return EcisDeck(lines)
+
+    @property
+    def lines(self) -> tuple[str, ...]:
+        return tuple(self.__lines)
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(self.__lines)
+
+    @property
+    def title(self) -> str:
+        return self.__lines[0]
+
+    @property
+    def projectile(self) -> Nuclei:
+        return Nuclei.from_string(self.title[self.title.index('+') + 1:self.title.index('=')].strip())
+
+    @property
+    def target(self) -> Nuclei:
+        return Nuclei.from_string(self.title[:self.title.index('+')].strip())
+
+    @property
+    def energy(self) -> float:
+        return float(self.title[self.title.index('E =') + len('E ='):self.title.index('MeV')])
+
+    @property
+    def information(self) -> numpy.ndarray:
+        return self.__information
+
+    @property
+    def opticals(self) -> numpy.ndarray:
+        return self.__opticals
+
+    @opticals.setter
+    def opticals(self, values: numpy.ndarray) -> None:
+        values = numpy.array(values, dtype=float).reshape(7, 3)
+        changed = numpy.flatnonzero((values != self.__opticals).any(axis=1))
+
+        for row in changed:
+            self.__lines[OPTICALS.start + row] = OPTICAL * 3 % tuple(values[row])
+
+        values.flags.writeable = False
+        self.__opticals = values
+
+    @property
+    def potential(self) -> numpy.ndarray:
+        return self.__opticals[POTENTIAL]
+
+    @potential.setter
+    def potential(self, values: numpy.ndarray) -> None:
+        opticals = self.__opticals.copy()
+        opticals[POTENTIAL] = values
+        self.opticals = opticals
+
+    @property
+    def xsections(self) -> numpy.ndarray:
+        return self.__xsections
+
+    @xsections.setter
+    def xsections(self, values: numpy.ndarray) -> None:
+        values = numpy.array(values, dtype=float).reshape(-1, 3)
+        card = self.__lines[COUNT]
+
+        self.__lines[COUNT + 1:COUNT + 1 + len(self.__xsections)] = format_table(values)
+        self.__lines[COUNT] = card[:2] + str(len(values)).rjust(3) + card[5:]
+
+        values.flags.writeable = False
+        self.__xsections = values
+
+    def variants(self, potentials: numpy.ndarray) -> Iterator[str]:
+        '''
+        Deck texts with the `potential` cells set to each row of `potentials`, shape `(n, 10)`.
+        The deck is compiled once into a `%` template with ten slots, so a variant costs one formatting call.
+        '''
+        template = [line.replace('%', '%%') for line in self.__lines]
+        cells = {row: [template[OPTICALS.start + row][WIDTH * i:WIDTH * (i + 1)] for i in range(3)] for row in set(POTENTIAL[0])}
+
+        for row, column in zip(*POTENTIAL):
+            cells[row][column] = OPTICAL
+
+        for row, card in cells.items():
+            template[OPTICALS.start + row] = ''.join(card) + template[OPTICALS.start + row][3 * WIDTH:]
+
+        template = '\n'.join(template)
+        for potential in numpy.asarray(potentials, dtype=float).reshape(-1, len(POTENTIAL[0])):
+            yield template % tuple(potential)
+
+    def write(self, file: str) -> None:
+        with open_text(file, 'w') as text:
+            text.write(self.text)
+
+
+def read_cards(lines: list[str], fields: int) -> numpy.ndarray:
+    '''
+    Numbers of fixed-width cards in one pass: the cards are padded to `fields * WIDTH` columns and viewed
+    as a `(len(lines), fields)` array of `WIDTH`-character strings; blank fields read as zero, as in ECIS
+
+    :return: numbers with shape `(len(lines), fields)`
+    :rtype: numpy.ndarray
+    '''
+    width = fields * WIDTH
+    cards = numpy.array([line[:width].ljust(width) for line in lines], dtype=f'U{width}')
+    cells = numpy.char.strip(cards.view(f'U{WIDTH}')).reshape(len(lines), fields)
+
+    return numpy.where(cells == '', '0', cells).astype(float)
+
+
+def format_column(values: numpy.ndarray, digits: int, width: int) -> numpy.ndarray:
+    '''
+    `str(round(value, digits))` of every value at once, through `%.{digits}f` with trailing zeros stripped.
+    The rare value that would overrun its field of `width` columns is cut to the significant digits that fit.
+
+    :return: strings, one per value
+    :rtype: numpy.ndarray
+    '''
+    values = numpy.asarray(values, dtype=float)
+    text = numpy.char.rstrip(numpy.char.mod(f'%.{digits}f', values), '0')
+    text = numpy.where(numpy.char.endswith(text, '.'), numpy.char.add(text, '0'), text)
+
+    for i in numpy.flatnonzero(numpy.char.str_len(text) > width):
+        text[i] = '%.*g' % (width - 1 - int(values[i] < 0), values[i])
+
+    return text
+
+
+def format_table(xsections: numpy.ndarray) -> list[str]:
+    '''
+    Cards of an angular distribution, rows of (angle, sigma, uncertainty); the angle field
+    starts with a blank, as `EcisGenerator` always wrote it
+
+    :return: one card per row
+    :rtype: list[str]
+    '''
+    angles = format_column(xsections[:, 0], 4, WIDTH - 1)
+    sigmas = format_column(xsections[:, 1], 4, WIDTH)
+    errors = format_column(xsections[:, 2], 2, WIDTH)
+
+    cards = numpy.char.add(numpy.char.add(' ', numpy.char.ljust(angles, WIDTH - 1)), numpy.char.ljust(sigmas, WIDTH))
+    return numpy.char.add(cards, numpy.char.ljust(errors, WIDTH)).tolist()
+
+
+if __name__ == '__main__':
+    pass
@@ -1,20 +1,34 @@
+from __future__ import annotations
+
 import os
 import numpy
+from typing import Iterable
+from concurrent.futures import ProcessPoolExecutor
 from globals import *
 from nuclei import Nuclei, Rutherford
+from storage import open_text, plain_name
+from ecisdeck import EcisDeck
+from ecisreader import walk
 
 
 class EcisGenerator:
-    def __init__(self, path: str, use_globalop: bool = False) -> None:
+    def __init__(self, path: str, use_globalop: bool = False, compression: str = "", family: type[GlobalPotential] = None) -> None:
+        '''
+        `compression` is a suffix of `storage.CODECS` to write the decks compressed, `""` for plain text;
+        `family` limits the global potentials to one family, see `GlobalPotentialFactory.create`
+        '''
         self.__path = path
         self.__use_globalop = use_globalop
+        self.__compression = compression
+        self.__family = family
+        self.__names = {}
 
     @property
     def path(self) -> str:
         return self.__path
     
     def generate(self, file: str) -> str:
-        with open(file, "r") as text:
+        with open_text(file, "r") as text:
             buffer = text.read().split("\n")
 
         beam = self.find_beam(buffer)
@@ -24,68 +38,73 @@ class EcisGenerator:
 
         return self.write_down(beam, target, energy, xsections)
 
-    def write_down(self, beam: Nuclei, target: Nuclei, energy: float, xsections: tuple[list[float]]) -> str:
-        directories = os.listdir(self.__path)
-        beamdir = self.__path + f"\\{beam.name}"
-        if beam.name not in directories:
-            os.mkdir(beamdir)
-
-        filename = f"{target.name}+{beam.name}_{round(energy, 2)}_in.txt"
-        if filename in os.listdir(beamdir):
-            filename = f"{target.name}+{beam.name}_{round(energy, 2)}_in_2.txt"
-
-        generated_file = beamdir + "\\" + filename
-
-        content = f"{target.name} + {beam.name} = {target.name} + {beam.name} E = {round(energy, 2)} MeV\n"
-        content += self.write_settings()
-        content += self.write_information(beam, target, energy)
-        content += self.write_opticals(beam, target, energy)
-        content += self.write_xsections(xsections)
-        content += "FIN"
-
-        with open(generated_file, "w") as file:
-            file.write(content)
-            
-        return generated_file
-    
-    def write_settings(self) -> str:
-        settings = "TFFFFFFFFFFFFFFTFFFFFFFFTTFTFFTTFFFFFFFFFFFF\n"
-        settings += "FFTTFTFFFFFFFFFFFFFFTFFTFFFFFFFFFFFFFFFFFFFF\n"
-        settings += "1    30                  6\n"
-        settings += "\n"
+    def generate_many(self, paths: Iterable[str], workers: int = None, errors: list[tuple[str, Exception]] = None) -> list[str]:
+        '''
+        `generate` of every file in `paths`, directories walked. Decks are built in a process pool by `render`,
+        which gets the file, the `use_globalop` flag and the family only; names are then given and the decks written here,
+        in input order, against names listed once per beam directory. Files that fail to parse are appended
+        to `errors` as `(file, exception)`. `workers=1` builds in-process.
+
+        :return: generated files
+        :rtype: list[str]
+        '''
+        files = [file for path in paths for file in (walk(path) if os.path.isdir(path) else [path])]
+        flags = [self.__use_globalop] * len(files)
+        families = [self.__family] * len(files)
+
+        if workers == 1:
+            decks = list(map(render, files, flags, families))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                decks = list(pool.map(render, files, flags, families, chunksize=64))
 
-        return settings
+        generated = []
+        for file, deck in zip(files, decks):
+            if isinstance(deck, Exception):
+                if errors is not None:
+                    errors.append((file, deck))
+                continue
 
-    def write_information(self, beam: Nuclei, target: Nuclei, energy: float) -> str:
-        incomes = [
-            0.0,                     # target spin
-            energy,                  # energy in lab
-            0.0,                     # projectile spin
-            float(beam.A),           # projectile mass
-            float(target.A),         # target mass
-            float(beam.Z * target.Z) # product of charges
-        ]
+            beam, stem, text = deck
+            generated_file = self.claim(beam, stem)
+            with open_text(generated_file, "w") as out:
+                out.write(text)
 
-        info = ""
-        for inc in incomes:
-            info += str(round(inc, 2)).ljust(10)
+            generated.append(generated_file)
 
-        return info + "\n0    0    0    0\n0.0\n"
+        return generated
 
-    def write_opticals(self, beam: Nuclei, target: Nuclei, energy: float) -> str:
-        sample = self.create_sample(beam, target, energy)
+    def write_down(self, beam: Nuclei, target: Nuclei, energy: float, xsections: tuple[list[float]]) -> str:
+        generated_file = self.claim(beam.name, f"{target.name}+{beam.name}_{round(energy, 2)}")
 
-        opticals = ""
-        for params in sample:
-            for par in params:
-                opticals += "{:.3f}".format(par).ljust(10)
+        deck = EcisDeck.create(beam, target, energy, self.create_sample(beam, target, energy), xsections)
+        deck.write(generated_file)
 
-            opticals += "\n"
+        return generated_file
 
-        return opticals + "\n"
+    def claim(self, beam: str, stem: str) -> str:
+        '''
+        First free name of `{stem}_in.txt`, `{stem}_in_2.txt`, ... in the beam directory. The directory is
+        listed once per generator and every name given is remembered, so N decks cost no more than N lookups.
+        '''
+        beamdir = os.path.join(self.__path, beam)
+        if beamdir not in self.__names:
+            os.makedirs(beamdir, exist_ok=True)
+            self.__names[beamdir] = set(map(plain_name, os.listdir(beamdir)))
+
+        names = self.__names[beamdir]
+        filename, index = f"{stem}_in.txt", 1
+        while filename in names:
+            index += 1
+            filename = f"{stem}_in_{index}.txt"
+
+        names.add(filename)
+        return os.path.join(beamdir, filename + self.__compression)
     
     def create_sample(self, beam: Nuclei, target: Nuclei, energy: float) -> list[list[float]]:
-        if self.__use_globalop == False:
+        goptype = GlobalPotentialFactory.create(beam, target, energy, self.__family) if self.__use_globalop else None
+
+        if goptype is None:
             sample = [
                 [100.0, 1.200, 0.500], # Real Volume
                 [ 20.0, 1.200, 0.500], # Imag Volume
@@ -96,12 +115,7 @@ class EcisGenerator:
                 [1.300,   0.0,   0.0]  # Coulomb
             ]
         else:
-            goptype = GlobalPotentialFactory.create(beam, target, energy)
-            if goptype is None:
-                self.__use_globalop = False
-                self.create_sample(beam, target, energy)
-            
-            gop = goptype(beam, target, energy)
+            gop = goptype(target.A, target.Z, energy)
             Vr, rv, av = gop.real_volume_depth(), gop.real_volume_radius(), gop.real_volume_diffuseness()
             Wv, rw, aw = gop.imag_volume_depth(), gop.imag_volume_radius(), gop.imag_volume_diffuseness()
             Wd, rd, ad = gop.imag_surface_depth(), gop.imag_surface_radius(), gop.imag_surface_diffuseness()
@@ -119,28 +133,6 @@ class EcisGenerator:
 
         return sample
 
-    def write_xsections(self, xsections: tuple[list[float]]) -> str:
-        n = len(xsections[0])
-        content = "1.0".ljust(10) + "1.0".ljust(10) + "179.0".ljust(10) + "\n"
-        content += "1".ljust(5) + "2".ljust(5) + "6".ljust(5) + "20".ljust(5) + "\n"
-        content += "T0" + str(n).rjust(3) + "1".rjust(5) + "\n"
-
-        for i in range(n):
-            angle = xsections[0][i]
-            xsec = xsections[1][i]
-            unc = xsections[2][i]
-
-            angle_str = str(round(angle, 4))
-            xsec_str = str(round(xsec, 4))
-            unc_str = str(round(unc, 2))
-
-            content += " " + angle_str.ljust(9) + xsec_str.ljust(10) + unc_str.ljust(10) + "\n"
-
-        content += "0.01".ljust(10) + "0.01".ljust(10) + "0.01".ljust(10) + "\n"
-        content += "1".ljust(5) + "2".ljust(5) + "3".ljust(5) + "\n"
-
-        return content
-
     def find_beam(self, buffer: list[str]) -> Nuclei:
         info = buffer[0]
         start = info.index("Projectile:")
@@ -185,34 +177,36 @@ class EcisGenerator:
         return angles, xsections, uncertainties
 
 
-def generate_all() -> None:
-    gen = EcisGenerator(".\\ecis\\in")
+def render(file: str, use_globalop: bool, family: type[GlobalPotential] = None) -> tuple[str, str, str] | Exception:
+    '''
+    Deck of one `xsections` file, built by a generator of its own so that pool workers share nothing
 
-    direct = ".\\xsections"
-    projs = os.listdir(direct)
-    projs = [direct + "\\" + proj for proj in projs]
-    
-    counter = 0
-    for proj in projs:
-        files = os.listdir(proj)
-        files = [proj + "\\" + file for file in files]
-        for file in files:
-            gen.generate(file)
-            counter += 1
+    :return: beam name, file name stem and deck text, or the exception the file raised
+    :rtype: tuple[str, str, str] | Exception
+    '''
+    gen = EcisGenerator("", use_globalop, family=family)
+
+    try:
+        with open_text(file, "r") as text:
+            buffer = text.read().split("\n")
 
-    print(f"{counter} files was generated.")
+        beam, target, energy = gen.find_beam(buffer), gen.find_target(buffer), gen.find_energy(buffer)
+        deck = EcisDeck.create(beam, target, energy, gen.create_sample(beam, target, energy), gen.take_xsections(buffer))
+    except (OSError, ValueError, IndexError, KeyError, StopIteration) as error:
+        return error
+
+    return beam.name, f"{target.name}+{beam.name}_{round(energy, 2)}", deck.text
+
+
+def generate_all(workers: int = None) -> None:
+    gen = EcisGenerator(os.path.join(".", "ecis", "in"))
+    files = gen.generate_many([os.path.join(".", "xsections")], workers)
+
+    print(f"{len(files)} files was generated.")
 
 
 if __name__ == '__main__':
-    gen = EcisGenerator(".\\ecis\\v2\\in\\", use_globalop=True)
+    gen = EcisGenerator(os.path.join(".", "ecis", "v2", "in"), use_globalop=True)
+    files = gen.generate_many([os.path.join(".", "xsections", "v2", "8Li")])
 
-    direct = ".\\xsections\\v2\\8Li"
-    
-    counter = 0
-    files = os.listdir(direct)
-    files = [direct + "\\" + file for file in files]
-    for file in files:
-        gen.generate(file)
-        counter += 1
-
-    print(f"{counter} files was generated.")
+    print(f"{len(files)} files was generated.")
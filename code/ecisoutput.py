@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import os
+import re
+import numpy
+from concurrent.futures import ProcessPoolExecutor
+from ecisreader import walk
+from xsarchive import save_columns, load_columns
+from storage import open_text
+
+
+# Columns of a report archive; `chi2_table` and `angular` are flat with `*_offsets`
+COLUMNS = ('files', 'potential', 'chi2', 'chi2_initial', 'reaction', 'seconds', 'workspace', 'field_length',
+           'searched', 'complete', 'chi2_offsets', 'chi2_table', 'angular_offsets', 'angular')
+
+# Fortran fields may run into their labels, `DEPTH13377.700195` or `(REDUCED-5.547680)`
+NUMBER = r'\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[ED][-+]?\d+)?)'
+POTENTIAL_LINE = re.compile(r'(?:DEPTH|CHARGES)' + NUMBER + r'.*REDUCED(?: VALUE)?' + NUMBER + r'.*DIFFUSENESS' + NUMBER)
+
+NUMERIC = frozenset('0123456789+-.')
+
+
+class EcisReport:
+    '''
+    What an ECIS report says about the last calculation it ran, the final one after a search:
+
+        potential       (Vr, rv, av, Wv, rw, aw, Wd, rd, ad, rc), reduced radii as in the decks
+        chi2_table      rows of (angle, calc., exp., exp. error, cor. error, chi2)
+        chi2            final chi2, `chi2_initial` the one of the deck parameters
+        reaction        total reaction cross section, mb
+        angular         rows of (angle, sigma in mb / sr, sigma / sigma_Ruth) on the 1 deg grid
+        seconds         total run time
+        workspace       working field used, `field_length` the one available
+
+    Missing sections are NaN or empty; `complete` tells whether the report reached the workspace summary.
+    '''
+    def __init__(self, file: str, potential: numpy.ndarray, chi2_table: numpy.ndarray, chi2: float, chi2_initial: float,
+                 reaction: float, angular: numpy.ndarray, seconds: float, workspace: int, field_length: int,
+                 searched: bool, complete: bool) -> None:
+        self.__file = file
+        self.__potential = potential
+        self.__chi2_table = chi2_table
+        self.__chi2 = chi2
+        self.__chi2_initial = chi2_initial
+        self.__reaction = reaction
+        self.__angular = angular
+        self.__seconds = seconds
+        self.__workspace = workspace
+        self.__field_length = field_length
+        self.__searched = searched
+        self.__complete = complete
+
+    @property
+    def file(self) -> str:
+        return self.__file
+
+    @property
+    def potential(self) -> numpy.ndarray:
+        return self.__potential
+
+    @property
+    def chi2_table(self) -> numpy.ndarray:
+        return self.__chi2_table
+
+    @property
+    def chi2(self) -> float:
+        return self.__chi2
+
+    @property
+    def chi2_initial(self) -> float:
+        return self.__chi2_initial
+
+    @property
+    def reaction(self) -> float:
+        return self.__reaction
+
+    @property
+    def angular(self) -> numpy.ndarray:
+        return self.__angular
+
+    @property
+    def seconds(self) -> float:
+        return self.__seconds
+
+    @property
+    def workspace(self) -> int:
+        return self.__workspace
+
+    @property
+    def field_length(self) -> int:
+        return self.__field_length
+
+    @property
+    def searched(self) -> bool:
+        return self.__searched
+
+    @property
+    def complete(self) -> bool:
+        return self.__complete
+
+
+def read_report(file: str) -> EcisReport:
+    '''
+    One forward pass over an ECIS report. The sections of a calculation always come in the same order
+    (potentials, chi2 table, chi2, reaction cross section, 1 deg table), so a cursor moves from one to the next
+    by `str.find`, which runs in C; plots and S-matrices in between never reach Python code. After a search
+    the pass starts at the final results, so earlier calculations are skipped rather than parsed.
+    The report is read whole rather than line by line: reports stay under a few hundred kB, and skipping
+    with `str.find` is what keeps the pass fast, so memory per file follows the report size.
+    '''
+    with open_text(file) as text:
+        text = text.read()
+
+    chi2 = chi2_initial = reaction = seconds = numpy.nan
+    chi2_table, angular = numpy.empty((0, 6)), numpy.empty((0, 3))
+    potential = numpy.full(10, numpy.nan)
+
+    found = find_line(text, 'WORKING FIELD LENGTH', 0, 1000)
+    field_length = int(found[0].split()[-1]) if found else -1
+
+    cursor = max(text.rfind('FINAL RESULTS'), 0)
+    searched = cursor > 0 and text.rfind('SEARCH ENDED', 0, cursor) >= 0
+
+    found = find_line(text, '************ CHI2', 0, cursor or None)
+    if found:
+        chi2_initial = float(found[0].split()[-1].replace('D', 'E'))
+
+    found = find_line(text, 'OPTICAL POTENTIALS', cursor)
+    if found:
+        cursor, blocks = found[1], []
+        while len(blocks) < 7:
+            found = find_line(text, 'FERMI (REDUCED', cursor, cursor + 1000)
+            if not found:
+                break
+            blocks.append(read_potential_line(found[0]))
+            cursor = found[1]
+
+        if len(blocks) == 7:
+            potential[0:3], potential[3:6], potential[6:9], potential[9] = blocks[0], blocks[1], blocks[3], blocks[6][1]
+
+    found = find_line(text, 'CALC. VAL.', cursor)
+    if found:
+        chi2_table, cursor = read_table(text, found[1], 6)
+
+    found = find_line(text, '************ CHI2', cursor)
+    if found:
+        chi2, cursor = float(found[0].split()[-1].replace('D', 'E')), found[1]
+        chi2_initial = chi2 if numpy.isnan(chi2_initial) else chi2_initial
+
+    found = find_line(text, 'TOTAL REACTION CROSS SECTION', cursor)
+    if found:
+        reaction, cursor = float(found[0].split('=')[1].split()[0]), found[1]
+
+    found = find_line(text, 'ANGLE    CROSS-SECTION', cursor)
+    if found:
+        angular, cursor = read_table(text, found[1], 3)
+
+    # Both are printed last, so searching back from the end is short
+    position = text.rfind('*** TOTAL TIME ***', cursor)
+    if position >= 0:
+        fields = find_line(text, '*** TOTAL TIME ***', position)[0].split()
+        seconds = 3600 * int(fields[4][:-1]) + 60 * int(fields[5][:-2]) + int(fields[6][:-1]) + int(fields[7][:-4]) / 100
+
+    position = text.rfind('WORKSPACE USED', cursor)
+    workspace = int(find_line(text, 'WORKSPACE USED', position)[0].split()[6]) if position >= 0 else -1
+
+    return EcisReport(file, potential, chi2_table, chi2, chi2_initial, reaction, angular,
+                      seconds, workspace, field_length, searched, workspace >= 0)
+
+
+def find_line(text: str, marker: str, start: int, stop: int = None) -> tuple[str, int] | None:
+    '''
+    :return: the first line holding `marker` in `text[start:stop]` and the position of its end, `None` if there is none
+    :rtype: tuple[str, int] | None
+    '''
+    position = text.find(marker, start, len(text) if stop is None else stop)
+    if position < 0:
+        return None
+
+    begin = text.rfind('\n', 0, position) + 1
+    end = text.find('\n', position)
+    end = len(text) if end < 0 else end
+
+    return text[begin:end], end
+
+
+def read_table(text: str, position: int, width: int) -> tuple[numpy.ndarray, int]:
+    '''
+    Rows of `width` numbers from `position` on, blank lines before the first row skipped
+
+    :return: table with shape `(rows, width)`, position after the last row
+    :rtype: tuple[numpy.ndarray, int]
+    '''
+    values = []
+
+    while position < len(text):
+        stop = text.find('\n', position + 1)
+        stop = len(text) if stop < 0 else stop
+        fields = text[position:stop].split()
+
+        if len(fields) == 0 and len(values) == 0:
+            position = stop
+            continue
+
+        if len(fields) != width or fields[0][0] not in NUMERIC:
+            break
+
+        values.extend(fields)
+        position = stop
+
+    return numpy.array(values, dtype=float).reshape(-1, width), position
+
+
+def read_potential_line(line: str) -> tuple[float, float, float]:
+    '''
+    A potential line of either layout ECIS prints, before a search
+    `DEPTH 180.5 MEV RADIUS 3.6082 FERMI (REDUCED VALUE 0.729) DIFFUSENESS 0.852 FERMI`
+    and in the final results `... FERMI (REDUCED 0.729) ...`; Coulomb lines carry the product of charges as the depth
+
+    :return: depth, reduced radius, diffuseness
+    :rtype: tuple[float, float, float]
+    '''
+    depth, radius, diffuseness = POTENTIAL_LINE.search(line).groups()
+    return float(depth), float(radius), float(diffuseness)
+
+
+class ReportArchive:
+    '''
+    Reports of a tree packed by `build_reports` into `.npy` columns (see `COLUMNS`), memory-mapped;
+    the tables of report `i` are the `i`-th CSR slices of `chi2_table` and `angular`
+    '''
+    def __init__(self, path: str) -> None:
+        self.__columns = load_columns(path, COLUMNS)
+
+    def __len__(self) -> int:
+        return len(self.__columns['files'])
+
+    def __getitem__(self, name: str) -> numpy.ndarray:
+        return self.__columns[name]
+
+    def chi2_table(self, i: int) -> numpy.ndarray:
+        offsets = self.__columns['chi2_offsets']
+        return self.__columns['chi2_table'][offsets[i]:offsets[i + 1]]
+
+    def angular(self, i: int) -> numpy.ndarray:
+        offsets = self.__columns['angular_offsets']
+        return self.__columns['angular'][offsets[i]:offsets[i + 1]]
+
+
+def build_reports(path: str, archive: str, workers: int = None) -> int:
+    '''
+    Parses every report under `path` in a process pool and packs the results into the `archive` directory
+
+    :return: number of reports
+    :rtype: int
+    '''
+    files = list(walk(path))
+
+    if workers == 1:
+        reports = [read_report(file) for file in files]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            reports = list(pool.map(read_report, files, chunksize=16))
+
+    lengths = lambda tables: numpy.concatenate([[0], numpy.cumsum([len(table) for table in tables], dtype=numpy.int64)])
+    tables = [report.chi2_table for report in reports]
+    angulars = [report.angular for report in reports]
+
+    columns = {
+        'files': numpy.array([os.path.relpath(file, path) for file in files], dtype=str),
+        'potential': numpy.array([report.potential for report in reports]).reshape(-1, 10),
+        'chi2': numpy.array([report.chi2 for report in reports]),
+        'chi2_initial': numpy.array([report.chi2_initial for report in reports]),
+        'reaction': numpy.array([report.reaction for report in reports]),
+        'seconds': numpy.array([report.seconds for report in reports]),
+        'workspace': numpy.array([report.workspace for report in reports], dtype=numpy.int64),
+        'field_length': numpy.array([report.field_length for report in reports], dtype=numpy.int64),
+        'searched': numpy.array([report.searched for report in reports], dtype=bool),
+        'complete': numpy.array([report.complete for report in reports], dtype=bool),
+        'chi2_offsets': lengths(tables),
+        'chi2_table': numpy.concatenate(tables) if tables else numpy.empty((0, 6)),
+        'angular_offsets': lengths(angulars),
+        'angular': numpy.concatenate(angulars) if angulars else numpy.empty((0, 3))
+    }
+
+    save_columns(archive, columns)
+
+    return len(files)
+
+
+if __name__ == '__main__':
+    pass
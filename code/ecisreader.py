@@ -1,6 +1,12 @@
+from __future__ import annotations
+
 import os
 import numpy
+from typing import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from nuclei import Nuclei
+from storage import open_text
+from ecisdeck import OPTICALS
 
 
 class EcisReader:
@@ -8,7 +14,7 @@ class EcisReader:
         pass
 
     def read(self, file: str) -> tuple[numpy.ndarray, numpy.ndarray]:
-        with open(file, 'r') as txt:
+        with open_text(file) as txt:
             buffer = txt.read().split('\n')
 
         proj = self.read_projectile(buffer)
@@ -18,6 +24,35 @@ class EcisReader:
 
         return (numpy.array([proj[0], proj[1], targ[0], targ[1], ener]), numpy.array(opts))
 
+    def read_many(self, files: Iterable[str], workers: int = None, chunk: int = 64) -> Iterator[tuple[str, tuple[numpy.ndarray, numpy.ndarray] | Exception]]:
+        '''
+        `read` of many files: paths are streamed into a process pool in chunks of `chunk` and results are
+        yielded as chunks finish, in no particular order. A file that fails to parse yields its exception
+        instead of aborting the rest. `workers=1` reads in-process.
+
+        :return: `(file, (inputs, outputs))` or `(file, exception)` pairs
+        :rtype: Iterator
+        '''
+        if workers == 1:
+            for file in files:
+                yield read_chunk([file])[0]
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs, part = [], []
+
+            for file in files:
+                part.append(file)
+                if len(part) == chunk:
+                    jobs.append(pool.submit(read_chunk, part))
+                    part = []
+
+            if len(part) != 0:
+                jobs.append(pool.submit(read_chunk, part))
+
+            for job in as_completed(jobs):
+                yield from job.result()
+
     def read_projectile(self, buffer: list[str]) -> tuple[int, int]:
         start = buffer[0].index('+')
         stop = buffer[0].index('=')
@@ -26,7 +61,7 @@ class EcisReader:
 
     def read_target(self, buffer: list[str]) -> tuple[int, int]:
         stop = buffer[0].index('+')
-        targ = Nuclei.from_string(buffer[0][:stop])
+        targ = Nuclei.from_string(buffer[0][:stop].strip())
         return (targ.Z, targ.A)
 
     def read_energy(self, buffer: list[str]) -> float:
@@ -35,7 +70,7 @@ class EcisReader:
         return float(buffer[0][start+len('E ='):stop].strip())
 
     def read_optical_parameters(self, buffer: list[str]) -> list[float]:
-        starting_index, stopping_index = 8, 15
+        starting_index, stopping_index = OPTICALS.start, OPTICALS.stop
         params = []
 
         for i in range(starting_index, stopping_index):
@@ -48,6 +83,44 @@ class EcisReader:
 
         return params
 
+    def read_potential_parameters(self, buffer: list[str]) -> list[float]:
+        '''
+        Central potential in the fixed layout (Vr, rv, av, Wv, rw, aw, Wd, rd, ad, rc),
+        zeros kept, unlike `read_optical_parameters`
+
+        :return: ten parameters
+        :rtype: list[float]
+        '''
+        rows = [buffer[OPTICALS.start + i].split() for i in (0, 1, 3, 6)]
+        return [float(value) for value in rows[0] + rows[1] + rows[2]] + [float(rows[3][0])]
+
+
+def walk(path: str) -> Iterator[str]:
+    '''
+    Files under `path` by `os.scandir`, depth first in name order; dotfiles and dot-directories are skipped
+    '''
+    with os.scandir(path) as scan:
+        entries = sorted((entry for entry in scan if not entry.name.startswith('.')), key=lambda entry: entry.name)
+
+    for entry in entries:
+        if entry.is_dir():
+            yield from walk(entry.path)
+        elif entry.is_file():
+            yield entry.path
+
+
+def read_chunk(files: list[str]) -> list[tuple[str, tuple[numpy.ndarray, numpy.ndarray] | Exception]]:
+    ecr = EcisReader()
+    results = []
+
+    for file in files:
+        try:
+            results.append((file, ecr.read(file)))
+        except (OSError, ValueError, IndexError, KeyError) as error:
+            results.append((file, error))
+
+    return results
+
 
 if __name__ == '__main__':
     pass
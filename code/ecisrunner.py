@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import os
+import time
+import tempfile
+import subprocess
+from typing import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from ecisdeck import EcisDeck
+from eciscache import ResultCache, deck_key, executable_key
+from storage import open_text, plain_name, copy_member
+
+
+# ECIS reads the deck on unit 5 and prints the report on unit 6; scratch units go to the working directory
+ECIS = os.environ.get('ECIS', 'ecis')
+SCRATCH = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+class RunResult:
+    '''
+    Outcome of one ECIS job: `output` is the report written, `None` when every attempt failed, in which case
+    `error` tells why; `returncode` and `seconds` are those of the last attempt, `-1` for one that timed out.
+    A report taken from a `ResultCache` took no attempt.
+    '''
+    def __init__(self, deck: str, output: str | None, returncode: int, seconds: float, attempts: int, error: str | None) -> None:
+        self.__deck = deck
+        self.__output = output
+        self.__returncode = returncode
+        self.__seconds = seconds
+        self.__attempts = attempts
+        self.__error = error
+
+    @property
+    def deck(self) -> str:
+        return self.__deck
+
+    @property
+    def output(self) -> str | None:
+        return self.__output
+
+    @property
+    def returncode(self) -> int:
+        return self.__returncode
+
+    @property
+    def seconds(self) -> float:
+        return self.__seconds
+
+    @property
+    def attempts(self) -> int:
+        return self.__attempts
+
+    @property
+    def error(self) -> str | None:
+        return self.__error
+
+    @property
+    def ok(self) -> bool:
+        return self.__output is not None
+
+    @property
+    def cached(self) -> bool:
+        return self.__attempts == 0
+
+
+class EcisRunner:
+    '''
+    Runs ECIS on decks, given as files or `EcisDeck` objects, in a bounded pool of subprocesses. Every attempt
+    gets a scratch directory of its own on tmpfs, is killed after `timeout` seconds and is repeated up to
+    `retries` times when it times out, exits non-zero or prints nothing. Reports are moved into place only
+    once complete. `executable` is a path or a whole command, so a stand-in can take the place of ECIS;
+    commands run in the scratch directory, so their arguments must be absolute paths:
+
+        EcisRunner([sys.executable, os.path.abspath('fakeecis.py'), os.path.abspath('../ecis/v1')]).run_many(decks)
+
+    With a `cache`, a deck whose `deck_key` is stored for this executable gets its report from there and ECIS does not run.
+    '''
+    def __init__(self, executable: str | list[str] = ECIS, workers: int = None, timeout: float = 600.0,
+                 retries: int = 1, scratch: str = SCRATCH, cache: ResultCache = None) -> None:
+        self.__command = [executable] if isinstance(executable, str) else list(executable)
+        if os.sep in self.__command[0]:
+            self.__command[0] = os.path.abspath(self.__command[0])
+        self.__workers = os.cpu_count() if workers is None else workers
+        self.__timeout = timeout
+        self.__retries = retries
+        self.__scratch = scratch
+        self.__cache = cache
+        self.__executable = executable_key(self.__command)
+
+    @property
+    def command(self) -> list[str]:
+        return list(self.__command)
+
+    @property
+    def workers(self) -> int:
+        return self.__workers
+
+    @property
+    def cache(self) -> ResultCache | None:
+        return self.__cache
+
+    def run(self, deck: str | EcisDeck, output: str = None) -> RunResult:
+        '''
+        Runs one deck; the report goes to `output`, by default the `report_file` of a deck file
+        or `report_name` in the working directory for an `EcisDeck`. A compression suffix of `output` is honoured.
+        '''
+        if isinstance(deck, EcisDeck):
+            name, text = deck.title, deck.text
+            output = report_name(deck) if output is None else output
+        else:
+            with open_text(deck) as source:
+                name, text = deck, source.read()
+            output = report_file(deck) if output is None else output
+
+        key = None if self.__cache is None else deck_key(text, self.__executable)
+        if key is not None and self.__cache.get(key, output):
+            return RunResult(name, output, 0, 0.0, 0, None)
+
+        returncode, seconds, error = -1, 0.0, None
+
+        for attempt in range(1, self.__retries + 2):
+            with tempfile.TemporaryDirectory(prefix='ecis-', dir=self.__scratch) as scratch:
+                with open(os.path.join(scratch, 'ecis.inp'), 'w') as cards:
+                    cards.write(text if text.endswith('\n') else text + '\n')
+
+                start = time.perf_counter()
+                try:
+                    with open(os.path.join(scratch, 'ecis.inp'), 'r') as stdin, open(os.path.join(scratch, 'ecis.out'), 'w') as stdout:
+                        process = subprocess.run(self.__command, stdin=stdin, stdout=stdout, stderr=subprocess.PIPE,
+                                                 cwd=scratch, timeout=self.__timeout)
+                    returncode, error = process.returncode, process.stderr.decode(errors='replace').strip()[-1000:] or None
+                except subprocess.TimeoutExpired:
+                    returncode, error = -1, f'timed out after {self.__timeout} s'
+                except OSError as exception:
+                    returncode, error = -1, str(exception)
+                seconds = time.perf_counter() - start
+
+                report = os.path.join(scratch, 'ecis.out')
+                if returncode == 0 and os.path.getsize(report) > 0:
+                    copy_member(report, output)
+                    if key is not None:
+                        self.__cache.put(key, report, seconds)
+                    return RunResult(name, output, returncode, seconds, attempt, None)
+
+                if returncode == 0:
+                    error = 'empty report'
+                elif error is None:
+                    error = f'exit code {returncode}'
+
+        return RunResult(name, None, returncode, seconds, self.__retries + 1, error)
+
+    def run_many(self, decks: Iterable[str | EcisDeck], output: str = None) -> list[RunResult]:
+        '''
+        `run` of every deck, `workers` at a time; the threads only wait on their subprocesses, so ECIS runs
+        on all cores. Reports go to `output` when given, under `report_name`, else next to the decks.
+
+        :return: results in the order of `decks`
+        :rtype: list[RunResult]
+        '''
+        decks = list(decks)
+        outputs = [None if output is None else os.path.join(output, report_name(deck)) for deck in decks]
+
+        with ThreadPoolExecutor(max_workers=self.__workers) as pool:
+            return list(pool.map(self.run, decks, outputs))
+
+
+def report_file(deck: str) -> str:
+    '''
+    :return: the report of a deck in the mirrored `out` tree, `ecis/v2/in/8Li/13C+8Li_14.0_in.txt`
+             reporting to `ecis/v2/out/8Li/13C+8Li_14.0_out.txt`, compression suffix kept
+    :rtype: str
+    '''
+    before, _, after = deck.rpartition(os.sep + 'in' + os.sep)
+    directory, name = os.path.split(before + os.sep + 'out' + os.sep + after if before else deck)
+
+    head, _, tail = name.rpartition('_in')
+
+    return os.path.join(directory, head + '_out' + tail)
+
+
+def report_name(deck: str | EcisDeck) -> str:
+    '''
+    :return: base name of the report of a deck file or of an `EcisDeck`, `27Al+7Li_9.0_out.txt`
+    :rtype: str
+    '''
+    if isinstance(deck, EcisDeck):
+        return f'{deck.target.name}+{deck.projectile.name}_{round(deck.energy, 2)}_out.txt'
+
+    head, _, tail = plain_name(os.path.basename(deck)).rpartition('_in')
+    return head + '_out' + tail
+
+
+if __name__ == '__main__':
+    pass
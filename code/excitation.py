@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import math
+import numpy
+from nuclei import Nuclei
+from coulomb import kinematics, phase_shifts, wave_functions
+from partialwaves import PartialWaves
+from opticalsolver import PARAMETERS, OpticalSolver, Scattering, numerov, match, optical_potential
+from ecisgenerator import EcisGenerator
+from fitter import sample_parameters
+
+
+class Excitation(Scattering):
+    def __init__(self, energies: numpy.ndarray, angles: numpy.ndarray, xsections: numpy.ndarray,
+                 ratios: numpy.ndarray, reaction: numpy.ndarray, smatrix: numpy.ndarray) -> None:
+        super().__init__(angles, xsections, ratios, reaction, smatrix)
+        self.__energies = energies
+
+    @property
+    def energies(self) -> numpy.ndarray:
+        '''
+        Lab energies of the rows of `xsections`, `ratios`, `reaction` and `smatrix`
+
+        :return: `E`, MeV
+        :rtype: numpy.ndarray
+        '''
+        return self.__energies
+
+
+class EnergyScan:
+    '''
+    Elastic scattering of one reaction over many lab energies. The radial mesh, centrifugal barrier,
+    Legendre table and Coulomb functions of every energy are prepared once; energy-independent
+    parameters build the potential once, and all energies are integrated as one Numerov batch.
+    Mesh and `lmax` are sized for the extreme energies of the scan.
+    '''
+    CHUNK = OpticalSolver.CHUNK
+
+    def __init__(self, proj: Nuclei, targ: Nuclei, energies: numpy.ndarray, angles: numpy.ndarray = None,
+                 step: float = 0.05, radius: float = None, lmax: int = None) -> None:
+        self.__proj = proj
+        self.__targ = targ
+        self.__energies = numpy.asarray(energies, dtype=float)
+        self.__angles = numpy.arange(1.0, 180.0, 1.0) if angles is None else numpy.asarray(angles, dtype=float)
+
+        kinematic = numpy.array([kinematics(proj, targ, energy) for energy in self.__energies])
+        self.__factor = kinematic[0, 0]
+        self.__k, self.__eta = kinematic[:, 1], kinematic[:, 2]
+
+        if radius is None:
+            radius = max(1.6 * self.reduced_radius + 12.0, float(numpy.max(2.2 * self.__eta / self.__k)))
+
+        self.__step = step
+        self.__points = int(math.ceil(radius / step))
+        self.__radius = self.__points * step
+        self.__r = step * numpy.arange(self.__points + 1) # fm
+
+        if lmax is None:
+            lmax = int(numpy.max(self.__k) * self.__radius) + 10
+        self.__l = numpy.arange(lmax + 1)
+
+        r, l = self.__r[1:, None, None], self.__l[None, None, :]
+        self.__centrifugal = l * (l + 1) / r ** 2
+
+        # Coulomb functions of all energies at the two outermost mesh points in one vectorised call
+        rho = self.__k[:, None] * numpy.array([self.__radius - step, self.__radius])
+        sigma = phase_shifts(self.__eta, lmax)
+        F, G = wave_functions(self.__eta[:, None], rho, lmax)
+        self.__coulomb = (F[:, 0], G[:, 0], F[:, 1], G[:, 1])
+
+        self.__waves = [PartialWaves(k, eta, lmax, self.__angles, sigma_l) for k, eta, sigma_l in zip(self.__k, self.__eta, sigma)]
+
+    @property
+    def projectile(self) -> Nuclei:
+        return self.__proj
+
+    @property
+    def target(self) -> Nuclei:
+        return self.__targ
+
+    @property
+    def energies(self) -> numpy.ndarray:
+        return self.__energies.copy()
+
+    @property
+    def angles(self) -> numpy.ndarray:
+        return self.__angles.copy()
+
+    @property
+    def reduced_radius(self) -> float:
+        return math.pow(self.__targ.A, 1/3) + math.pow(self.__proj.A, 1/3)
+
+    @property
+    def matching_radius(self) -> float:
+        return self.__radius
+
+    @property
+    def lmax(self) -> int:
+        return int(self.__l[-1])
+
+    def scan(self, params: numpy.ndarray) -> Excitation:
+        '''
+        Excitation function for one parameter set shared by all energies, shape `(10,)`,
+        or for energy-dependent parameters with one row per energy, shape `(n_energies, 10)`; a single row
+        `(1, 10)` is shared like a flat set
+
+        :return: `sigma(theta, E)` and ratios with shape `(n_energies, n_angles)`, `sigma_R(E)` with shape `(n_energies,)`
+        :rtype: Excitation
+        '''
+        params = numpy.asarray(params, dtype=float)
+        if params.shape == (1, len(PARAMETERS)):
+            params = params[0]
+        if params.shape not in ((len(PARAMETERS),), (len(self.__energies), len(PARAMETERS))):
+            raise ValueError(f'params must have shape ({len(PARAMETERS)},) or ({len(self.__energies)}, {len(PARAMETERS)}), not {params.shape}')
+
+        potential = self.__factor * optical_potential(self.__r, self.reduced_radius, self.__proj.Z * self.__targ.Z, params)
+        potential = potential[:, 1:].T[:, :, None] # point, 1 or energy, 1
+
+        chunk = max(1, self.CHUNK // (len(self.__l) * self.__points))
+        smatrix = []
+        for i in range(0, len(self.__energies), chunk):
+            part = slice(i, i + chunk)
+            v = potential if params.ndim == 1 else potential[:, part]
+            g = self.__centrifugal - self.__k[part, None] ** 2 + v
+
+            ua, ub = numerov(self.__step, g)
+            smatrix.append(match(ua, ub, *[functions[part] for functions in self.__coulomb]))
+
+        smatrix = numpy.concatenate(smatrix)
+        xsections, ratios = numpy.array([waves.cross_sections(S) for waves, S in zip(self.__waves, smatrix)]).transpose(1, 0, 2)
+        reaction = numpy.array([waves.reaction_cross_section(S) for waves, S in zip(self.__waves, smatrix)])
+
+        return Excitation(self.__energies.copy(), self.__angles.copy(), xsections, ratios, reaction, smatrix)
+
+    def scan_global(self) -> Excitation:
+        '''
+        Excitation function of the global potential registered for the reaction,
+        re-evaluated at every energy (the `create_sample` defaults when none applies)
+
+        :return: `sigma(theta, E)`, ratios and `sigma_R(E)`
+        :rtype: Excitation
+        '''
+        gen = EcisGenerator('', use_globalop=True)
+        params = numpy.array([sample_parameters(gen.create_sample(self.__proj, self.__targ, float(energy))) for energy in self.__energies])
+
+        return self.scan(params)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import os
+import sys
+from ecisdeck import EcisDeck
+from ecisreader import walk
+from ecisrunner import report_file
+from storage import open_text, plain_name, locate
+
+
+def replay(store: str, text: str) -> str | None:
+    '''
+    Stored report of a deck: the one paired with a deck of the same reaction under `store` whose cards
+    are identical, else with the first deck of the same reaction, as `ecis/v1` pairs `in` and `out`
+
+    :return: report text, `None` when `store` holds no deck of the reaction
+    :rtype: str | None
+    '''
+    deck = EcisDeck.parse(text.rstrip('\n'))
+    stem = f'{deck.target.name}+{deck.projectile.name}_{round(deck.energy, 2)}_in'
+    fallback = None
+
+    for file in walk(store):
+        name = plain_name(os.path.basename(file))
+        if name != stem + '.txt' and not name.startswith(stem + '_'):
+            continue
+
+        report = locate(plain_name(report_file(file)))
+        if report is None:
+            continue
+
+        with open_text(file) as cards:
+            if cards.read().rstrip('\n') == deck.text:
+                fallback = report
+                break
+
+        fallback = report if fallback is None else fallback
+
+    if fallback is None:
+        return None
+
+    with open_text(fallback) as report:
+        return report.read()
+
+
+if __name__ == '__main__':
+    # Stand-in for the ECIS executable, `python fakeecis.py <store>`: deck on standard input, report on standard output
+    report = replay(sys.argv[1], sys.stdin.read())
+    if report is None:
+        sys.exit('no stored report for this deck')
+
+    sys.stdout.write(report)
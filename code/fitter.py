@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import os
+import functools
+import numpy
+from concurrent.futures import ProcessPoolExecutor
+from nuclei import Nuclei
+from ecisgenerator import EcisGenerator
+from opticalsolver import OpticalSolver
+from storage import open_text
+
+
+FREE = 9 # Vr .. ad are searched, rc stays at the value of its starting point
+LOWER = numpy.array([0.0, 0.3, 0.1, 0.0, 0.3, 0.1, 0.0, 0.3, 0.1, 0.3])
+UPPER = numpy.array([1000.0, 2.5, 1.5, 500.0, 2.5, 1.5, 500.0, 2.5, 1.5, 3.0])
+
+
+class Experiment:
+    def __init__(self, proj: Nuclei, targ: Nuclei, energy: float, angles: numpy.ndarray,
+                 xsections: numpy.ndarray, uncertainties: numpy.ndarray) -> None:
+        self.__proj = proj
+        self.__targ = targ
+        self.__energy = energy
+        self.__angles = numpy.asarray(angles, dtype=float)
+        self.__xsections = numpy.asarray(xsections, dtype=float)
+        self.__uncertainties = numpy.asarray(uncertainties, dtype=float)
+
+    @property
+    def projectile(self) -> Nuclei:
+        return self.__proj
+
+    @property
+    def target(self) -> Nuclei:
+        return self.__targ
+
+    @property
+    def energy(self) -> float:
+        return self.__energy
+
+    @property
+    def angles(self) -> numpy.ndarray:
+        return self.__angles
+
+    @property
+    def xsections(self) -> numpy.ndarray:
+        '''
+        Measured elastic cross sections, ratios to Rutherford already converted
+
+        :return: `sigma(theta)`, mb / sr
+        :rtype: numpy.ndarray
+        '''
+        return self.__xsections
+
+    @property
+    def uncertainties(self) -> numpy.ndarray:
+        '''
+        Percentage uncertainties as written to the ECIS decks
+
+        :return: `d sigma / sigma`, %
+        :rtype: numpy.ndarray
+        '''
+        return self.__uncertainties
+
+    @property
+    def errors(self) -> numpy.ndarray:
+        '''
+        Absolute errors built from the percentage uncertainties, as ECIS does
+
+        :return: `d sigma(theta)`, mb / sr
+        :rtype: numpy.ndarray
+        '''
+        return self.__xsections * self.__uncertainties / 100
+
+    @classmethod
+    def read(cls, file: str) -> Experiment:
+        with open_text(file) as text:
+            buffer = text.read().rstrip().split('\n')
+
+        gen = EcisGenerator('')
+        angles, xsections, uncertainties = gen.take_xsections(buffer)
+
+        return cls(gen.find_beam(buffer), gen.find_target(buffer), gen.find_energy(buffer), angles, xsections, uncertainties)
+
+
+class FitResult:
+    def __init__(self, experiment: Experiment, minima: numpy.ndarray, chi2s: numpy.ndarray) -> None:
+        order = numpy.argsort(chi2s)
+        self.__experiment = experiment
+        self.__minima = minima[order]
+        self.__chi2s = chi2s[order]
+
+    @property
+    def experiment(self) -> Experiment:
+        return self.__experiment
+
+    @property
+    def best(self) -> numpy.ndarray:
+        '''
+        Parameters of the deepest minimum found, `EcisReader.read_optical_parameters` order
+
+        :return: (Vr, rv, av, Wv, rw, aw, Wd, rd, ad, rc)
+        :rtype: numpy.ndarray
+        '''
+        return self.__minima[0]
+
+    @property
+    def chi2(self) -> float:
+        return float(self.__chi2s[0])
+
+    @property
+    def minima(self) -> numpy.ndarray:
+        '''
+        End points of every start, sorted by chi2
+
+        :return: parameters with shape `(starts, 10)`
+        :rtype: numpy.ndarray
+        '''
+        return self.__minima
+
+    @property
+    def chi2s(self) -> numpy.ndarray:
+        return self.__chi2s
+
+    def spread(self, tolerance: float = 2.0) -> numpy.ndarray:
+        '''
+        Standard deviation of the parameters over the minima whose chi2
+        stays within `tolerance` times the best one
+
+        :return: spread of (Vr, rv, av, Wv, rw, aw, Wd, rd, ad, rc)
+        :rtype: numpy.ndarray
+        '''
+        accepted = self.__chi2s <= tolerance * self.__chi2s[0]
+        return numpy.std(self.__minima[accepted], axis=0)
+
+
+class OpticalFitter:
+    '''
+    Levenberg-Marquardt search of the optical parameters against one angular distribution.
+    All starting points march in lockstep: every iteration costs two batched solves,
+    one for the Jacobians of the still active starts and one for their trial steps.
+    '''
+    def __init__(self, experiment: Experiment, step: float = 0.05) -> None:
+        self.__experiment = experiment
+        self.__solver = OpticalSolver(experiment.projectile, experiment.target, experiment.energy, experiment.angles, step)
+        self.__errors = experiment.errors
+
+    @property
+    def experiment(self) -> Experiment:
+        return self.__experiment
+
+    @property
+    def solver(self) -> OpticalSolver:
+        return self.__solver
+
+    def residuals(self, params: numpy.ndarray) -> numpy.ndarray:
+        '''
+        Weighted residuals `(sigma_calc - sigma_exp) / d sigma_exp`, one row per parameter set
+
+        :return: residuals with shape `(N, n_angles)`
+        :rtype: numpy.ndarray
+        '''
+        xsections = self.__solver.solve_batch(params).xsections
+        return (xsections - self.__experiment.xsections) / self.__errors
+
+    def chi2(self, params: numpy.ndarray) -> numpy.ndarray:
+        return numpy.sum(self.residuals(params) ** 2, axis=-1)
+
+    def starts(self, count: int = 16, seed: int = 0) -> numpy.ndarray:
+        '''
+        Starting points: the global potential of the reaction (when one is registered),
+        the fixed defaults of `EcisGenerator.create_sample` and random perturbations of both
+
+        :return: parameters with shape `(count, 10)`
+        :rtype: numpy.ndarray
+        '''
+        proj, targ, energy = self.__experiment.projectile, self.__experiment.target, self.__experiment.energy
+        seeds = [sample_parameters(EcisGenerator('', use_globalop=flag).create_sample(proj, targ, energy)) for flag in (True, False)]
+        seeds = numpy.unique(numpy.array(seeds), axis=0)
+
+        starts = perturb(seeds[numpy.arange(max(count, len(seeds))) % len(seeds)], numpy.random.default_rng(seed))
+        starts[:len(seeds)] = seeds
+
+        return starts[:count]
+
+    def fit(self, starts: numpy.ndarray, iterations: int = 100, tolerance: float = 1e-6) -> FitResult:
+        params = numpy.clip(numpy.atleast_2d(numpy.array(starts, dtype=float)), LOWER, UPPER)
+        residuals = self.residuals(params)
+        chi2 = numpy.sum(residuals ** 2, axis=-1)
+        damping = numpy.full(len(params), 1e-2)
+        active = numpy.ones(len(params), dtype=bool)
+
+        for _ in range(iterations):
+            if not numpy.any(active):
+                break
+
+            index = numpy.flatnonzero(active)
+            J = self.__jacobian(params[index], residuals[index])
+            JTJ = numpy.einsum('mni,mnj->mij', J, J)
+            gradient = numpy.einsum('mni,mn->mi', J, residuals[index])
+
+            diagonal = numpy.maximum(numpy.diagonal(JTJ, axis1=1, axis2=2), 1e-12)
+            A = JTJ + damping[index, None, None] * diagonal[:, :, None] * numpy.eye(FREE)
+            delta = -numpy.linalg.solve(A, gradient[:, :, None])[:, :, 0]
+
+            trial = params[index].copy()
+            trial[:, :FREE] += delta
+            trial = numpy.clip(trial, LOWER, UPPER)
+            trial_residuals = self.residuals(trial)
+            trial_chi2 = numpy.sum(trial_residuals ** 2, axis=-1)
+
+            better = trial_chi2 < chi2[index]
+            accepted = index[better]
+            converged = better & (chi2[index] - trial_chi2 <= tolerance * chi2[index])
+
+            params[accepted] = trial[better]
+            residuals[accepted] = trial_residuals[better]
+            chi2[accepted] = trial_chi2[better]
+
+            damping[index] = numpy.where(better, damping[index] / 3, damping[index] * 4)
+            active[index[converged | (damping[index] > 1e10)]] = False
+
+        return FitResult(self.__experiment, params, chi2)
+
+    def __jacobian(self, params: numpy.ndarray, residuals: numpy.ndarray) -> numpy.ndarray:
+        # The cross sections at `params` are known from their residuals, so only the 9 shifted sets are solved
+        base = residuals * self.__errors + self.__experiment.xsections
+        return self.__solver.jacobian(params, central=False, base=base) / self.__errors[None, :, None]
+
+
+def perturb(params: numpy.ndarray, rng: numpy.random.Generator) -> numpy.ndarray:
+    '''
+    Random neighbours of parameter sets: depths scaled log-normally by ~30%,
+    radii by ~8% and diffusenesses by ~15%, rc untouched, all kept within bounds
+
+    :return: perturbed copy of `params`
+    :rtype: numpy.ndarray
+    '''
+    params = numpy.atleast_2d(numpy.asarray(params, dtype=float))
+    scales = numpy.ones_like(params)
+    scales[:, [0, 3, 6]] = rng.lognormal(0.0, 0.3, (len(params), 3))
+    scales[:, [1, 4, 7]] = 1 + rng.normal(0.0, 0.08, (len(params), 3))
+    scales[:, [2, 5, 8]] = 1 + rng.normal(0.0, 0.15, (len(params), 3))
+
+    return numpy.clip(params * scales, LOWER, UPPER)
+
+
+def sample_parameters(sample: list[list[float]]) -> numpy.ndarray:
+    '''
+    `EcisGenerator.create_sample` rows flattened to the `EcisReader.read_optical_parameters` order
+
+    :return: (Vr, rv, av, Wv, rw, aw, Wd, rd, ad, rc)
+    :rtype: numpy.ndarray
+    '''
+    return numpy.array([*sample[0], *sample[1], *sample[3], sample[6][0]], dtype=float)
+
+
+def fit_file(file: str, starts: int = 16, seed: int = 0) -> FitResult:
+    fitter = OpticalFitter(Experiment.read(file))
+    return fitter.fit(fitter.starts(starts, seed))
+
+
+def fit_all(directory: str, workers: int = None, starts: int = 16, seed: int = 0) -> dict[str, FitResult]:
+    '''
+    Fits every angular distribution under `directory`, one reaction per task of a process pool.
+    Reactions are independent, so the wall time falls linearly with `workers`.
+
+    :return: fit results keyed by data file
+    :rtype: dict[str, FitResult]
+    '''
+    files = sorted(os.path.join(root, name) for root, _, names in os.walk(directory) for name in names if name.endswith('.txt'))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(functools.partial(fit_file, starts=starts, seed=seed), files, chunksize=1)
+        return dict(zip(files, results))
+
+
+if __name__ == '__main__':
+    results = fit_all(os.path.join('..', 'xsections', 'v2'))
+
+    for file, result in results.items():
+        print(os.path.basename(file), round(result.chi2, 2), numpy.round(result.best, 3).tolist())
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import math
+import functools
+import numpy
+from nuclei import Nuclei
+
+
+STEP = 0.05     # fm
+POINTS = 1024   # radial and momentum mesh, r < 51.2 fm, k < 62.8 1 / fm
+
+# M3Y effective interactions: Yukawa strengths in MeV at ranges 1/4 and 1/2.5 fm
+# and the zero-range knock-on exchange J00 (1 - slope * E/A) in MeV * fm^3
+M3Y_REID = {
+    'V4'  :  7999.0,
+    'V25' : -2134.0,
+    'J00' :  -276.0,
+    'J00e':   0.005
+}
+
+M3Y_PARIS = {
+    'V4'  : 11062.0,
+    'V25' : -2538.0,
+    'J00' :  -590.0,
+    'J00e':   0.002
+}
+
+
+def mesh() -> tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    Radial and momentum meshes shared by all transforms, `r_n = n dr`, `k_m = m pi / (N dr)`
+
+    :return: `r` in fm, `k` in 1 / fm
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    '''
+    n = numpy.arange(POINTS)
+    return n * STEP, n * math.pi / (POINTS * STEP)
+
+
+def sine_transform(f: numpy.ndarray, step: float) -> numpy.ndarray:
+    '''
+    `sum_n f_n sin(pi m n / N) step` by one FFT of the odd extension of `f`
+    '''
+    odd = numpy.concatenate([f, [0.0], -f[:0:-1]])
+    return -numpy.fft.fft(odd).imag[:len(f)] / 2 * step
+
+
+def to_momentum(f: numpy.ndarray) -> numpy.ndarray:
+    '''
+    Spherical Fourier transform `4 pi / k * int r f(r) sin(kr) dr` on `mesh()`
+    '''
+    r, k = mesh()
+    transform = numpy.empty(POINTS)
+    transform[1:] = 4 * math.pi / k[1:] * sine_transform(r * f, STEP)[1:]
+    transform[0] = 4 * math.pi * numpy.sum(r ** 2 * f) * STEP
+
+    return transform
+
+
+def to_coordinate(f: numpy.ndarray) -> numpy.ndarray:
+    '''
+    Inverse spherical Fourier transform `1 / (2 pi^2 r) * int k f(k) sin(kr) dk` on `mesh()`
+    '''
+    r, k = mesh()
+    dk = k[1]
+    transform = numpy.empty(POINTS)
+    transform[1:] = sine_transform(k * f, dk)[1:] / (2 * math.pi ** 2 * r[1:])
+    transform[0] = numpy.sum(k ** 2 * f) * dk / (2 * math.pi ** 2)
+
+    return transform
+
+
+def density(nuclei: Nuclei, r: numpy.ndarray) -> numpy.ndarray:
+    '''
+    Point-nucleon density normalised to `A`: harmonic-oscillator shell model
+    `(1 + alpha (r/b)^2) exp(-(r/b)^2)` up to A = 16, with alpha = (A - 4) / 6 filling the p shell,
+    and a two-parameter Fermi shape above. Both follow the systematic rms radius `0.82 A^(1/3) + 0.58` fm.
+
+    :return: `rho(r)`, 1 / fm^3
+    :rtype: numpy.ndarray
+    '''
+    A = nuclei.A
+    rms = 0.82 * math.pow(A, 1/3) + 0.58
+
+    if A <= 16:
+        alpha = max(0.0, (A - 4) / 6)
+        b = rms * math.sqrt((4 + 6 * alpha) / (6 + 15 * alpha))
+        shape = (1 + alpha * (r / b) ** 2) * numpy.exp(-(r / b) ** 2)
+    else:
+        R = 1.12 * math.pow(A, 1/3) - 0.86 * math.pow(A, -1/3)
+        shape = 1 / (1 + numpy.exp((r - R) / 0.54))
+
+    return A * shape / (4 * math.pi * numpy.sum(r ** 2 * shape) * (r[1] - r[0]))
+
+
+@functools.lru_cache(maxsize=256)
+def density_transform(nuclei: Nuclei) -> numpy.ndarray:
+    '''
+    Memoised momentum-space density of a nucleus on `mesh()`, read-only and shared by every folding
+
+    :return: `rho(k)`, dimensionless
+    :rtype: numpy.ndarray
+    '''
+    r, _ = mesh()
+    transform = to_momentum(density(nuclei, r))
+    transform.flags.writeable = False
+
+    return transform
+
+
+def interaction_transform(interaction: dict[str, float], energy: float) -> numpy.ndarray:
+    '''
+    Momentum-space M3Y interaction at lab energy per projectile nucleon `energy`;
+    `exp(-mu s) / (mu s)` transforms to `4 pi / (mu (mu^2 + k^2))`
+
+    :return: `v(k)`, MeV * fm^3
+    :rtype: numpy.ndarray
+    '''
+    _, k = mesh()
+    yukawa = sum(interaction[key] * 4 * math.pi / (mu * (mu ** 2 + k ** 2)) for key, mu in (('V4', 4.0), ('V25', 2.5)))
+
+    return yukawa + interaction['J00'] * (1 - interaction['J00e'] * energy)
+
+
+def fold(proj: Nuclei, targ: Nuclei, energy: float, interaction: dict[str, float] = M3Y_REID) -> tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    Double-folded real potential `V(R) = int int rho_p(r1) rho_t(r2) v(|R + r2 - r1|)`,
+    a product of three transforms in momentum space and one inverse FFT
+
+    :return: `R` in fm, `V(R)` in MeV
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    '''
+    r, _ = mesh()
+    product = density_transform(proj) * density_transform(targ) * interaction_transform(interaction, energy / proj.A)
+
+    return r, to_coordinate(product)
+
+
+def fit_woods_saxon(r: numpy.ndarray, potential: numpy.ndarray, reduced_radius: float) -> tuple[float, float, float]:
+    '''
+    Woods-Saxon `-V f(r, r0 * reduced_radius, a)` closest to `potential` in relative terms out to
+    where it falls below 1% of its depth, so the surface that elastic scattering probes weighs
+    as much as the interior. For every (r0, a) of a grid the depth is the weighted linear least-squares one;
+    the grid is refined once around the best node.
+
+    :return: `V` in MeV, `r0` and `a` in fm
+    :rtype: tuple[float, float, float]
+    '''
+    depth = -numpy.min(potential)
+    inside = r <= r[numpy.flatnonzero(-potential >= 0.01 * depth)[-1]]
+    r, potential = r[inside], -potential[inside]
+
+    radii, diffusenesses = numpy.linspace(0.3, 2.0, 86), numpy.linspace(0.2, 1.5, 66)
+    for _ in range(2):
+        R, a = numpy.meshgrid(radii, diffusenesses, indexing='ij')
+        shapes = 1 / (1 + numpy.exp((r - reduced_radius * R[..., None]) / a[..., None]))
+        depths = numpy.sum(shapes / potential, axis=-1) / numpy.sum((shapes / potential) ** 2, axis=-1)
+        residuals = numpy.sum((depths[..., None] * shapes / potential - 1) ** 2, axis=-1)
+
+        i, j = numpy.unravel_index(numpy.argmin(residuals), residuals.shape)
+        best = float(depths[i, j]), float(radii[i]), float(diffusenesses[j])
+        radii = numpy.linspace(radii[i] - 0.02, radii[i] + 0.02, 41)
+        diffusenesses = numpy.linspace(diffusenesses[j] - 0.02, diffusenesses[j] + 0.02, 41)
+
+    return best
+
+
+if __name__ == '__main__':
+    pass
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import math
 from nuclei import Nuclei
+from folding import M3Y_REID, fold, fit_woods_saxon
 
 
 def register_potential(cls: type[GlobalPotential]) -> type[GlobalPotential]:
@@ -17,9 +18,13 @@ class GlobalPotentialFactory:
         self._registry.append(potential)
 
     @classmethod
-    def create(self, projectile: Nuclei, target: Nuclei, energy: float) -> type[GlobalPotential]:
+    def create(self, projectile: Nuclei, target: Nuclei, energy: float, family: type[GlobalPotential] = None) -> type[GlobalPotential]:
+        '''
+        First registered potential that applies to the reaction; `family`, a `GlobalPotential` subclass such as
+        `FoldingPotential`, restricts the choice to its members, which potentials registered earlier would shadow
+        '''
         for potential in self._registry:
-            if potential(projectile, target, energy).applies_to(projectile, target, energy):
+            if (family is None or issubclass(potential, family)) and potential.applies_to(projectile, target, energy):
                 return potential
         return None
 
@@ -848,5 +853,115 @@ class XuBeryllium9(GlobalPotential):
         return projectile == Nuclei(4, 9)
 
 
+class FoldingPotential(GlobalPotential):
+    '''
+    Real part double-folded from the projectile and target densities with an M3Y interaction,
+    renormalised by `NR` and fitted back to Woods-Saxon (V, r, a); the volume absorption takes
+    the same shape scaled by `NI`, as in the Sao Paulo potential. A weak surface absorption, `NS` times
+    the folded depth on the same radius and diffuseness, fills the surface card so that decks carry all
+    ten parameters like those of the other families. Subclasses fix the projectile; 6Li, 7Li and 9Be
+    are registered after their phenomenological potentials and are reached with `family=FoldingPotential`.
+    '''
+    PROJECTILE: tuple[int, int] = None
+    INTERACTION: dict[str, float] = M3Y_REID
+
+    def __init__(self, nuclons: int, charge: int, energy: float) -> None:
+        super().__init__(Nuclei(*self.PROJECTILE), Nuclei(charge, nuclons), energy)
+        self.params = {
+            'NR':  1.00,
+            'NI':  0.78,
+            'NS':  0.10,
+            'rc':  1.30  # fm
+        }
+
+        reduced = math.pow(self._targ.A, 1/3) + math.pow(self._proj.A, 1/3)
+        self.depth, self.radius, self.diffuseness = fit_woods_saxon(*fold(self._proj, self._targ, energy, self.INTERACTION), reduced)
+
+    def real_volume_depth(self) -> float:
+        return self.params['NR'] * self.depth
+
+    def imag_volume_depth(self) -> float:
+        return self.params['NI'] * self.depth
+
+    def imag_surface_depth(self) -> float:
+        return self.params['NS'] * self.depth
+
+    def real_volume_radius(self) -> float:
+        return self.radius
+
+    def imag_volume_radius(self) -> float:
+        return self.radius
+
+    def imag_surface_radius(self) -> float:
+        return self.radius
+
+    def coulomb_radius(self) -> float:
+        rc = self.params['rc']
+        return rc * math.pow(self._targ.A, 1/3) / (math.pow(self._targ.A, 1/3) + math.pow(self._proj.A, 1/3))
+
+    def real_volume_diffuseness(self) -> float:
+        return self.diffuseness
+
+    def imag_volume_diffuseness(self) -> float:
+        return self.diffuseness
+
+    def imag_surface_diffuseness(self) -> float:
+        return self.diffuseness
+
+    @classmethod
+    def applies_to(self, projectile: Nuclei, target: Nuclei, energy: float) -> bool:
+        return self.PROJECTILE is not None and projectile == Nuclei(*self.PROJECTILE)
+
+
+@register_potential
+class FoldingLithium6(FoldingPotential):
+    PROJECTILE = (3, 6)
+
+
+@register_potential
+class FoldingLithium7(FoldingPotential):
+    PROJECTILE = (3, 7)
+
+
+@register_potential
+class FoldingBeryllium9(FoldingPotential):
+    PROJECTILE = (4, 9)
+
+
+@register_potential
+class FoldingBeryllium10(FoldingPotential):
+    PROJECTILE = (4, 10)
+
+
+@register_potential
+class FoldingBoron10(FoldingPotential):
+    PROJECTILE = (5, 10)
+
+
+@register_potential
+class FoldingBoron11(FoldingPotential):
+    PROJECTILE = (5, 11)
+
+
+@register_potential
+class FoldingCarbon12(FoldingPotential):
+    PROJECTILE = (6, 12)
+
+
+@register_potential
+class FoldingNitrogen14(FoldingPotential):
+    PROJECTILE = (7, 14)
+
+
+@register_potential
+class FoldingNitrogen15(FoldingPotential):
+    PROJECTILE = (7, 15)
+
+
+@register_potential
+class FoldingOxygen16(FoldingPotential):
+    PROJECTILE = (8, 16)
+
+
 if __name__ == '__main__':
     pass
\ No newline at end of file
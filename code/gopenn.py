@@ -5,35 +5,30 @@ import keras
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 
-from dataset import Dataset
+from dataset import Dataset, DatasetTable
 from ecisreader import EcisReader
 
 
 class GOPENN:
-    def __init__(self, dataset: list[Dataset], path: str, model_name: str) -> None:
-        self.dataset = dataset
+    def __init__(self, dataset: list[Dataset] | DatasetTable, path: str, model_name: str) -> None:
+        self.dataset = dataset if isinstance(dataset, DatasetTable) else DatasetTable.from_datasets(dataset)
         self.model_path = path
         self.model_name = model_name
 
     @property
     def model_folder(self) -> str:
-        return self.model_path + '\\' + self.model_name 
+        return os.path.join(self.model_path, self.model_name)
 
     def prepare_data(self) -> tuple:
-        xs = []
-        ys = []
+        table = self.dataset[self.dataset.labelled]
         scaler_x = StandardScaler()
         scaler_y = StandardScaler()
 
-        for i in range(len(self.datasets)):
-            xs.append(self.datasets[i].xs)
-            ys.append(self.datasets[i].ys)
+        xs_scaled = scaler_x.fit_transform(table.xs)
+        ys_scaled = scaler_y.fit_transform(table.ys)
 
-        xs_scaled = scaler_x.fit_transform(xs)
-        ys_scaled = scaler_y.fit_transform(ys)
-
-        xscale_file = self.model_folder + '\\' + 'xscale.pkl'
-        yscale_file = self.model_folder + '\\' + 'yscale.pkl'
+        xscale_file = os.path.join(self.model_folder, 'xscale.pkl')
+        yscale_file = os.path.join(self.model_folder, 'yscale.pkl')
 
         with open(xscale_file, 'wb') as file:
             pickle.dump(scaler_x, file)
@@ -45,12 +40,12 @@ class GOPENN:
 
     def build_model(self) -> keras.Sequential:
         model = keras.Sequential([
-            keras.layers.Input(shape=self.dataset[0].xs.shape),
+            keras.layers.Input(shape=(self.dataset.xs.shape[1],)),
             keras.layers.Dense(100, activation='relu'),
             keras.layers.Dense(100, activation='relu'),
             keras.layers.Dense(100, activation='relu'),
             keras.layers.Dense(100, activation='relu'),
-            keras.layers.Dense(self.dataset[0].ys.shape)
+            keras.layers.Dense(self.dataset.ys.shape[1])
         ])
 
         model.compile(optimizer=keras.optimizers.Adam(), loss='mse', metrics=['mae'])
@@ -62,7 +57,7 @@ class GOPENN:
         reaction_params_train, reaction_params_test, gops_train, gops_test = self.prepare_data()
 
         model = self.build_model()
-        checkpoint_filepath = self.model_folder + '\\' + self.model_name + '.keras'
+        checkpoint_filepath = os.path.join(self.model_folder, self.model_name + '.keras')
 
         callbacks = [keras.callbacks.EarlyStopping(patience=10, restore_best_weights=True, start_from_epoch=10), 
                     keras.callbacks.ModelCheckpoint(filepath=checkpoint_filepath, monitor='loss', save_best_only=True)]
@@ -74,25 +69,23 @@ class GOPENN:
         print("Error = ", error)
     
     def tabulate(self) -> None:
-        model_path = self.model_folder + '\\' + self.model_name + '.keras'
+        model_path = os.path.join(self.model_folder, self.model_name + '.keras')
         model = keras.models.load_model(model_path, compile=True)
         
-        with open(self.model_folder + '\\' + 'xscale.pkl', 'rb') as file:
+        with open(os.path.join(self.model_folder, 'xscale.pkl'), 'rb') as file:
             xscale = pickle.load(file)
     
-        with open(self.model_folder + '\\' + 'yscale.pkl', 'rb') as file:
+        with open(os.path.join(self.model_folder, 'yscale.pkl'), 'rb') as file:
             yscale = pickle.load(file)
     
-        pred_xs_raw = numpy.array([self.dataset[i].xs for i in range(len(self.dataset))])
-        pred_xs_scaled = xscale.transform(pred_xs_raw)
+        # ZAID sorting for convenience
+        rows = self.dataset.sort_by_zaid()
+        pred_xs_scaled = xscale.transform(rows.xs)
     
         pred_ys_scaled = model.predict(pred_xs_scaled)
         pred_ys_raw = yscale.inverse_transform(pred_ys_scaled)
     
-        # ZAID sorting for convenience
-        pred_xs_raw = sorted(pred_xs_raw, key=lambda x: 1000 * x[0] + x[1])
-    
-        with open(self.model_folder + '\\output.txt', 'w') as file:
+        with open(os.path.join(self.model_folder, 'output.txt'), 'w') as file:
             table = 'Zt'.center(6) + 'At'.center(6) + 'Elab'.center(10)
             params = ['V real', 'r real', 'a real',
                     'W volu', 'ir volu', 'ia volu',
@@ -104,8 +97,8 @@ class GOPENN:
                 table += param.center(10)
             table += '\n'
     
-            for i in range(len(pred_xs_raw)):
-                Z, A, En = int(pred_xs_raw[i][0]), int(pred_xs_raw[i][1]), pred_xs_raw[i][2]
+            for i in range(len(rows)):
+                Z, A, En = int(rows['Zt'][i]), int(rows['At'][i]), rows['E'][i]
                 table += str(Z).center(6) + str(A).center(6) + str(round(En, 1)).center(10)
     
                 for output in pred_ys_raw[i]:
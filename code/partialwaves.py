@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import math
+import numpy
+from coulomb import phase_shifts
+
+
+class LegendreCache:
+    '''
+    Read-only `P_l(cos theta)` tables shared by every partial-wave sum on the same angle grid.
+    A table is rebuilt only when a larger `lmax` is requested for its grid.
+    '''
+    _tables: dict[bytes, numpy.ndarray] = {}
+    _capacity = 256
+
+    @classmethod
+    def table(cls, lmax: int, angles: numpy.ndarray) -> numpy.ndarray:
+        angles = numpy.ascontiguousarray(angles, dtype=float)
+        key = angles.tobytes()
+        table = cls._tables.get(key)
+
+        if table is None or len(table) <= lmax:
+            if len(cls._tables) >= cls._capacity:
+                cls._tables.clear()
+
+            table = legendre_table(lmax, numpy.cos(numpy.radians(angles)))
+            table.flags.writeable = False
+            cls._tables[key] = table
+
+        return table[:lmax + 1]
+
+
+class PartialWaves:
+    '''
+    Legendre-sum engine for spinless elastic scattering on one angle grid:
+    `f(theta) = f_C(theta) + 1 / (2ik) * sum (2l + 1) exp(2i sigma_l) (S_l - 1) P_l(cos theta)`.
+    Everything but the S-matrix is prepared once, so each evaluation is a single
+    `(N, lmax + 1) @ (lmax + 1, n_angles)` product.
+    '''
+    def __init__(self, k: float, eta: float, lmax: int, angles: numpy.ndarray, sigma: numpy.ndarray = None) -> None:
+        self.__k = k
+        self.__eta = eta
+        self.__angles = numpy.asarray(angles, dtype=float)
+        self.__l = numpy.arange(lmax + 1)
+
+        sigma = phase_shifts(eta, lmax) if sigma is None else sigma[:lmax + 1]
+        half = numpy.radians(self.__angles) / 2
+
+        self.__coulomb = -eta / (2 * k * numpy.sin(half) ** 2) * numpy.exp(-2j * eta * numpy.log(numpy.sin(half)) + 2j * sigma[0])
+        self.__weights = (2 * self.__l + 1) * numpy.exp(2j * sigma) / (2j * k)
+        self.__legendre = LegendreCache.table(lmax, self.__angles)
+
+    @property
+    def angles(self) -> numpy.ndarray:
+        return self.__angles.copy()
+
+    @property
+    def lmax(self) -> int:
+        return int(self.__l[-1])
+
+    def amplitudes(self, smatrix: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        '''
+        Coulomb and nuclear amplitudes, the latter with one row per S-matrix row
+
+        :return: `f_C(theta)`, `f_N(theta)`, fm
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        '''
+        smatrix = numpy.asarray(smatrix)[..., :len(self.__l)]
+        lmax = smatrix.shape[-1] - 1
+        nuclear = (self.__weights[:lmax + 1] * (smatrix - 1)) @ self.__legendre[:lmax + 1]
+
+        return self.__coulomb, nuclear
+
+    def cross_sections(self, smatrix: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        '''
+        Elastic cross sections and their ratios to Rutherford ones
+
+        :return: `sigma(theta)` in mb / sr, `sigma / sigma_Ruth`
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        '''
+        coulomb, nuclear = self.amplitudes(smatrix)
+        xsections = 10 * numpy.abs(coulomb + nuclear) ** 2 # fm^2 / sr => millibarn / sr
+        rutherford = 10 * numpy.abs(coulomb) ** 2
+
+        return xsections, xsections / rutherford
+
+    def reaction_cross_section(self, smatrix: numpy.ndarray) -> numpy.ndarray:
+        '''
+        Total reaction cross section
+
+        :return: `sigma_R`, mb
+        :rtype: numpy.ndarray
+        '''
+        smatrix = numpy.asarray(smatrix)
+        l = numpy.arange(smatrix.shape[-1])
+        absorption = (2 * l + 1) * (1 - numpy.abs(smatrix) ** 2)
+
+        return 10 * math.pi / self.__k ** 2 * numpy.sum(absorption, axis=-1) # fm^2 => millibarn
+
+
+def legendre_table(lmax: int, cosines: numpy.ndarray) -> numpy.ndarray:
+    table = numpy.empty((lmax + 1, len(cosines)))
+    table[0] = 1.0
+    if lmax > 0:
+        table[1] = cosines
+
+    for l in range(1, lmax):
+        table[l + 1] = ((2 * l + 1) * cosines * table[l] - l * table[l - 1]) / (l + 1)
+
+    return table
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import os
+import hashlib
+import sqlite3
+import numpy
+from typing import Iterator
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataset import Dataset, DatasetTable
+from query import Reaction
+from ecisgenerator import EcisGenerator, render
+from ecisreader import EcisReader, walk
+from ecisoutput import read_report
+from ecisrunner import EcisRunner, report_file
+from eciscache import deck_key
+from storage import open_text, plain_name, locate
+
+
+STAGES = ('decks', 'reports', 'dataset', 'model', 'table')
+LABELS = ('deck', 'report')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS targets (
+    stage TEXT, source TEXT, hash TEXT, output TEXT, PRIMARY KEY (stage, source)
+);
+CREATE TABLE IF NOT EXISTS rows (
+    deck TEXT PRIMARY KEY, hash TEXT, inputs BLOB, labels BLOB
+);
+'''
+
+
+class Pipeline:
+    '''
+    The way from measurements to a trained `GOPENN` as a DAG of stages under `root`:
+
+        decks       xsections/<version>/...  ->  ecis/<version>/in/...     one deck per experiment file
+        reports     ecis/<version>/in/...    ->  ecis/<version>/out/...    one ECIS run per deck
+        dataset     (deck, report) pairs     ->  .pipeline/dataset.npz     inputs and labels, see `labels`
+        model       dataset                  ->  models/<name>/            scalers and network
+        table       model, dataset           ->  models/<name>/output.txt
+
+    Every item carries a content hash of its inputs in `.pipeline/state.sqlite` and is rebuilt only when that
+    hash changes, so a new experiment file costs one deck, one ECIS run and one dataset row before the model
+    stages. Decks and reports found on disk for a reaction are adopted the first time rather than regenerated.
+    Items are independent until the dataset: each deck is rendered in a process pool and handed to the ECIS
+    runner as soon as it is written, so generation and ECIS runs overlap.
+
+    `labels='deck'` labels every row with the optical parameters of its deck, as `Dataset.gather` does, so the
+    pipeline trains the model the manual `Dataset.gather` and `train_model` flow trains; `labels='report'` takes
+    the potential ECIS fitted instead. Either way a row needs a report, so decks whose ECIS run failed are left out.
+
+        Pipeline('..', versions=('v2',), runner=EcisRunner(cache=ResultCache(cache))).run()
+    '''
+    def __init__(self, root: str, versions: tuple[str, ...] = ('v0', 'v1', 'v2'), runner: EcisRunner = None,
+                 model_name: str = 'gopenn', use_globalop: bool = False, workers: int = None, labels: str = 'deck') -> None:
+        if labels not in LABELS:
+            raise ValueError(f'labels must be one of {LABELS}, not {labels!r}')
+
+        self.__root = root
+        self.__versions = versions
+        self.__runner = EcisRunner() if runner is None else runner
+        self.__model_name = model_name
+        self.__use_globalop = use_globalop
+        self.__workers = workers
+        self.__labels = labels
+        self.__folder = os.path.join(root, '.pipeline')
+
+        os.makedirs(self.__folder, exist_ok=True)
+        self.__connection = sqlite3.connect(os.path.join(self.__folder, 'state.sqlite'))
+        self.__connection.executescript(SCHEMA)
+
+    @property
+    def dataset_file(self) -> str:
+        return os.path.join(self.__folder, 'dataset.npz')
+
+    @property
+    def model_folder(self) -> str:
+        return os.path.join(self.__root, 'models', self.__model_name)
+
+    def close(self) -> None:
+        self.__connection.close()
+
+    def run(self, until: str = 'table', errors: list[tuple[str, Exception]] = None) -> dict[str, int]:
+        '''
+        Brings the stages up to `until` in line with the sources; items that fail are appended to `errors`
+        as `(file, exception)` and left out downstream
+
+        :return: number of items each stage rebuilt
+        :rtype: dict[str, int]
+        '''
+        last = STAGES.index(until)
+        built = dict.fromkeys(STAGES[:last + 1], 0)
+        errors = [] if errors is None else errors
+
+        with ProcessPoolExecutor(max_workers=self.__workers) as pool, ThreadPoolExecutor(max_workers=self.__runner.workers) as runs:
+            jobs, reports = {}, self.__recorded('reports')
+            for deck, fresh in self.__decks(pool, built, errors):
+                if last >= STAGES.index('reports'):
+                    job = self.__report(deck, fresh, reports.get(deck), runs, built)
+                    if job is not None:
+                        jobs[job[0]] = (deck, job[1])
+                self.__connection.commit()
+
+            for job in as_completed(jobs):
+                deck, digest = jobs[job]
+                result = job.result()
+                if result.ok:
+                    self.__record('reports', deck, digest, result.output)
+                else:
+                    self.__forget('reports', deck)
+                    errors.append((deck, RuntimeError(result.error)))
+                self.__connection.commit()
+
+            if last < STAGES.index('dataset'):
+                return built
+
+            table, digest = self.__dataset(pool, built, errors)
+            self.__connection.commit()
+
+        if last >= STAGES.index('model'):
+            self.__model(table, digest, built)
+        if last >= STAGES.index('table'):
+            self.__table(table, digest, built)
+
+        return built
+
+    def __decks(self, pool: Executor, built: dict[str, int], errors: list[tuple[str, Exception]]) -> Iterator[tuple[str, bool]]:
+        '''
+        Decks of every experiment file, `(deck, fresh)` as each becomes ready; `fresh` marks the ones written now
+        '''
+        recorded = self.__recorded('decks')
+        claimed = {output for _, output in recorded.values()}
+        present, jobs = set(), {}
+
+        for version in self.__versions:
+            generator = EcisGenerator(os.path.join(self.__root, 'ecis', version, 'in'), self.__use_globalop)
+            found = on_disk(generator.path)
+
+            for source in walk(os.path.join(self.__root, 'xsections', version)):
+                present.add(source)
+                digest = content_hash([source], str(self.__use_globalop))
+                old = recorded.get(source)
+
+                if old is not None and old[0] == digest and os.path.isfile(old[1]):
+                    yield old[1], False
+                else:
+                    jobs[pool.submit(render, source, self.__use_globalop)] = (generator, found, source, digest, old)
+
+        for job in as_completed(jobs):
+            generator, found, source, digest, old = jobs[job]
+            result = job.result()
+            if isinstance(result, Exception):
+                errors.append((source, result))
+                if old is not None:
+                    self.__drop(source, old[1])
+                continue
+
+            beam, stem, text = result
+            adopted = None if old is not None else next((deck for deck in found.get(stem, []) if deck not in claimed), None)
+            deck = adopted or (old[1] if old is not None else generator.claim(beam, stem))
+
+            if adopted is None:
+                with open_text(deck, 'w') as file:
+                    file.write(text)
+                built['decks'] += 1
+
+            claimed.add(deck)
+            self.__record('decks', source, digest, deck)
+            yield deck, adopted is None
+
+        for source in recorded.keys() - present:
+            deck = recorded[source][1]
+            for file in (deck, locate(plain_name(report_file(deck)))):
+                if file is not None and os.path.isfile(file):
+                    os.remove(file)
+
+            self.__drop(source, deck)
+
+    def __drop(self, source: str, deck: str) -> None:
+        '''
+        Forgets the deck of `source`, its report and its dataset row, so the next dataset leaves them out
+        '''
+        self.__forget('decks', source)
+        self.__forget('reports', deck)
+        self.__connection.execute('DELETE FROM rows WHERE deck = ?', (deck,))
+
+    def __report(self, deck: str, fresh: bool, old: tuple[str, str] | None, runs: Executor,
+                 built: dict[str, int]) -> tuple[Future, str] | None:
+        '''
+        Submits the ECIS run of `deck` unless its report, recorded as `old`, is up to date; a report already
+        on disk for a deck the pipeline did not write is adopted
+
+        :return: the run and the hash it will be recorded under, `None` when there is nothing to run
+        :rtype: tuple[Future, str] | None
+        '''
+        with open_text(deck) as file:
+            text = file.read()
+
+        digest = hashlib.sha256(((deck_key(text) or text) + ' '.join(self.__runner.command)).encode()).hexdigest()
+        existing = locate(plain_name(report_file(deck)))
+
+        if old is not None and old[0] == digest and os.path.isfile(old[1]):
+            return None
+
+        if old is None and not fresh and existing is not None:
+            self.__record('reports', deck, digest, existing)
+            return None
+
+        built['reports'] += 1
+        return runs.submit(self.__runner.run, deck, existing or report_file(deck)), digest
+
+    def __dataset(self, pool: Executor, built: dict[str, int], errors: list[tuple[str, Exception]]) -> tuple[DatasetTable, str]:
+        '''
+        One row per deck with a report, re-read only for pairs whose content changed, saved to `dataset_file`
+
+        :return: the table and its content hash
+        :rtype: tuple[DatasetTable, str]
+        '''
+        pairs = sorted(self.__recorded('reports').items())
+        rows = {deck: (digest, inputs, labels) for deck, digest, inputs, labels in self.__connection.execute('SELECT * FROM rows')}
+        digests = {deck: content_hash([deck, output], self.__labels) for deck, (_, output) in pairs}
+        stale = [(deck, output) for deck, (_, output) in pairs if rows.get(deck, (None,))[0] != digests[deck]]
+
+        for (deck, output), row in zip(stale, pool.map(read_row, stale, [self.__labels] * len(stale), chunksize=16)):
+            if isinstance(row, Exception):
+                errors.append((output, row))
+                continue
+
+            rows[deck] = (digests[deck], row[0].tobytes(), row[1].tobytes())
+            self.__connection.execute('INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)', (deck, *rows[deck]))
+            built['dataset'] += 1
+
+        decks = [deck for deck, _ in pairs if deck in rows]
+        self.__connection.executemany('DELETE FROM rows WHERE deck = ?', [(deck,) for deck in rows.keys() - set(decks)])
+
+        table = DatasetTable.from_datasets([Dataset(numpy.frombuffer(rows[deck][1]), numpy.frombuffer(rows[deck][2])) for deck in decks])
+        xs, ys = table.xs, table.ys
+        digest = hashlib.sha256(xs.tobytes() + ys.tobytes()).hexdigest()
+
+        if self.__recorded('dataset').get('dataset', (None,))[0] != digest or not os.path.isfile(self.dataset_file):
+            numpy.savez(self.dataset_file, xs=xs, ys=ys)
+            self.__record('dataset', 'dataset', digest, self.dataset_file)
+
+        return table, digest
+
+    def __model(self, table: DatasetTable, digest: str, built: dict[str, int]) -> None:
+        model = os.path.join(self.model_folder, self.__model_name + '.keras')
+        if self.__recorded('model').get('dataset', (None,))[0] == digest and os.path.isfile(model):
+            return
+
+        from gopenn import GOPENN  # keras and sklearn are needed from here on only
+
+        os.makedirs(self.model_folder, exist_ok=True)
+        GOPENN(table, os.path.join(self.__root, 'models'), self.__model_name).train_model()
+
+        with self.__connection:
+            self.__record('model', 'dataset', digest, model)
+        built['model'] += 1
+
+    def __table(self, table: DatasetTable, digest: str, built: dict[str, int]) -> None:
+        model = os.path.join(self.model_folder, self.__model_name + '.keras')
+        output = os.path.join(self.model_folder, 'output.txt')
+        key = content_hash([model], digest)
+
+        if self.__recorded('table').get('model', (None,))[0] == key and os.path.isfile(output):
+            return
+
+        from gopenn import GOPENN
+
+        GOPENN(table, os.path.join(self.__root, 'models'), self.__model_name).tabulate()
+
+        with self.__connection:
+            self.__record('table', 'model', key, output)
+        built['table'] += 1
+
+    def __recorded(self, stage: str) -> dict[str, tuple[str, str]]:
+        rows = self.__connection.execute('SELECT source, hash, output FROM targets WHERE stage = ?', (stage,))
+        return {source: (digest, output) for source, digest, output in rows}
+
+    def __record(self, stage: str, source: str, digest: str, output: str) -> None:
+        self.__connection.execute('INSERT OR REPLACE INTO targets VALUES (?, ?, ?, ?)', (stage, source, digest, output))
+
+    def __forget(self, stage: str, source: str) -> None:
+        self.__connection.execute('DELETE FROM targets WHERE stage = ? AND source = ?', (stage, source))
+
+
+def content_hash(files: list[str], *extra: str) -> str:
+    '''
+    :return: SHA-256 of the bytes of `files` and of the `extra` strings
+    :rtype: str
+    '''
+    digest = hashlib.sha256()
+    for file in files:
+        with open(file, 'rb') as content:
+            digest.update(content.read())
+
+    for part in extra:
+        digest.update(part.encode())
+
+    return digest.hexdigest()
+
+
+def on_disk(path: str) -> dict[str, list[str]]:
+    '''
+    :return: decks under `path` by their name stem, `27Al+7Li_9.0` for `27Al+7Li_9.0_in_2.txt`
+    :rtype: dict[str, list[str]]
+    '''
+    found = {}
+    if not os.path.isdir(path):
+        return found
+
+    for file in walk(path):
+        reaction = Reaction.from_name(file)
+        if reaction is not None and reaction.kind == 'in':
+            name = plain_name(os.path.basename(file))
+            found.setdefault(name[:name.rfind('_in')], []).append(file)
+
+    return found
+
+
+def read_row(pair: tuple[str, str], labels: str = 'deck') -> tuple[numpy.ndarray, numpy.ndarray] | Exception:
+    '''
+    Inputs of a deck with the optical parameters of the deck, as `EcisReader.read` gives them, or with the
+    potential fitted in its report for `labels='report'`; the exception either raised otherwise
+    '''
+    deck, report = pair
+    try:
+        inputs, parameters = EcisReader().read(deck)
+        if labels == 'report':
+            parameters = read_report(report).potential
+
+        return numpy.asarray(inputs, dtype=float), numpy.asarray(parameters, dtype=float)
+    except (OSError, ValueError, IndexError, KeyError) as error:
+        return error
+
+
+if __name__ == '__main__':
+    pipeline = Pipeline('..')
+    print(pipeline.run())
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import os
+import re
+from typing import Callable, Iterator
+from nuclei import Nuclei
+from dataset import Dataset
+from ecisreader import EcisReader, walk
+from fitter import Experiment
+
+
+# `27Al+7Li_9.0_in.txt` (`EcisGenerator.write_down`, `_in_2` for duplicates, `_out` for reports)
+# and `112Sn+6Li @ 21.0 MeV.txt` (`xsections`, possibly with a trailing note), either maybe compressed (`storage`)
+ECIS_NAME = re.compile(r'^(?P<target>[^+\s]+)\+(?P<projectile>[^_\s]+)_(?P<energy>\d+(?:\.\d*)?)_(?P<kind>in|out)(?:_\d+)?\.txt(?:\.\w+)?$')
+XSECTIONS_NAME = re.compile(r'^(?P<target>[^+\s]+)\+(?P<projectile>\S+) @ (?P<energy>\d+(?:\.\d*)?) MeV.*?\.txt(?:\.\w+)?$')
+
+
+class Reaction:
+    '''
+    What a file name tells about its content; `kind` is `'in'`, `'out'` or `'xsections'`
+    '''
+    def __init__(self, file: str, proj: Nuclei, targ: Nuclei, energy: float, kind: str) -> None:
+        self.__file = file
+        self.__proj = proj
+        self.__targ = targ
+        self.__energy = energy
+        self.__kind = kind
+
+    @property
+    def file(self) -> str:
+        return self.__file
+
+    @property
+    def projectile(self) -> Nuclei:
+        return self.__proj
+
+    @property
+    def target(self) -> Nuclei:
+        return self.__targ
+
+    @property
+    def energy(self) -> float:
+        return self.__energy
+
+    @property
+    def kind(self) -> str:
+        return self.__kind
+
+    @staticmethod
+    def from_name(file: str) -> Reaction | None:
+        '''
+        :return: the reaction encoded in the base name of `file`, `None` for names of neither layout
+        :rtype: Reaction | None
+        '''
+        name = os.path.basename(file)
+        match = ECIS_NAME.match(name)
+        kind = None if match is None else match['kind']
+
+        if match is None:
+            match = XSECTIONS_NAME.match(name)
+            kind = 'xsections'
+
+        if match is None:
+            return None
+
+        try:
+            proj, targ = Nuclei.from_string(match['projectile']), Nuclei.from_string(match['target'])
+        except (KeyError, ValueError, IndexError):
+            return None
+
+        return Reaction(file, proj, targ, float(match['energy']), kind)
+
+
+class Query:
+    '''
+    Lazy selection of the files under `path` by what their names encode. Every filter returns a new query;
+    nothing is opened until `datasets` or `experiments` is iterated, and then only the matching files.
+
+        Query('ecis').kind('in').projectile('7Li').target(A=(2, 16)).energy_per_nucleon(1.0, 10.0).datasets()
+    '''
+    def __init__(self, path: str, predicates: tuple[Callable[[Reaction], bool], ...] = ()) -> None:
+        self.__path = path
+        self.__predicates = predicates
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def where(self, predicate: Callable[[Reaction], bool]) -> Query:
+        return Query(self.__path, self.__predicates + (predicate,))
+
+    def kind(self, *kinds: str) -> Query:
+        return self.where(lambda reaction: reaction.kind in kinds)
+
+    def projectile(self, *projectiles: Nuclei | str) -> Query:
+        wanted = {(nuclei.Z, nuclei.A) for nuclei in map(as_nuclei, projectiles)}
+        return self.where(lambda reaction: (reaction.projectile.Z, reaction.projectile.A) in wanted)
+
+    def target(self, Z: int | tuple[int, int] = None, A: int | tuple[int, int] = None) -> Query:
+        '''
+        Targets by charge and mass number, each either exact or an inclusive `(low, high)` range
+        '''
+        Z, A = as_range(Z), as_range(A)
+        return self.where(lambda reaction: Z[0] <= reaction.target.Z <= Z[1] and A[0] <= reaction.target.A <= A[1])
+
+    def energy(self, low: float = 0.0, high: float = float('inf')) -> Query:
+        return self.where(lambda reaction: low <= reaction.energy <= high)
+
+    def energy_per_nucleon(self, low: float = 0.0, high: float = float('inf')) -> Query:
+        return self.where(lambda reaction: low <= reaction.energy / reaction.projectile.A <= high)
+
+    def reactions(self) -> Iterator[Reaction]:
+        for file in walk(self.__path):
+            reaction = Reaction.from_name(file)
+
+            if reaction is not None and all(predicate(reaction) for predicate in self.__predicates):
+                yield reaction
+
+    def files(self) -> Iterator[str]:
+        return (reaction.file for reaction in self.reactions())
+
+    def __iter__(self) -> Iterator[Reaction]:
+        return self.reactions()
+
+    def datasets(self) -> Iterator[Dataset]:
+        '''
+        Labelled datasets of the matching ECIS inputs
+        '''
+        ecr = EcisReader()
+
+        for reaction in self.reactions():
+            if reaction.kind == 'in':
+                yield Dataset(*ecr.read(reaction.file))
+
+    def experiments(self) -> Iterator[Experiment]:
+        '''
+        Measured angular distributions of the matching `xsections` files
+        '''
+        for reaction in self.reactions():
+            if reaction.kind == 'xsections':
+                yield Experiment.read(reaction.file)
+
+
+def as_nuclei(nuclei: Nuclei | str) -> Nuclei:
+    return Nuclei.from_string(nuclei) if isinstance(nuclei, str) else nuclei
+
+
+def as_range(value: int | tuple[int, int] | None) -> tuple[float, float]:
+    if value is None:
+        return (float('-inf'), float('inf'))
+
+    if isinstance(value, tuple):
+        return value
+
+    return (value, value)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import re
+import numpy
+from nuclei import Nuclei
+from ecisreader import EcisReader
+from partialwaves import PartialWaves
+from opticalsolver import Scattering
+
+
+SMATRIX_LINE = re.compile(r'^\s*(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+\.\d)\s+([-+]?\d\.\d+D[-+]\d+)\s*([-+]?\d\.\d+D[-+]\d+)\s+I')
+
+
+class SMatrix:
+    def __init__(self, proj: Nuclei, targ: Nuclei, energy: float, k: float, eta: float, elements: numpy.ndarray) -> None:
+        self.__proj = proj
+        self.__targ = targ
+        self.__energy = energy
+        self.__k = k
+        self.__eta = eta
+        self.__elements = elements
+        self.__waves: dict[bytes, PartialWaves] = {}
+
+    @property
+    def projectile(self) -> Nuclei:
+        return self.__proj
+
+    @property
+    def target(self) -> Nuclei:
+        return self.__targ
+
+    @property
+    def energy(self) -> float:
+        return self.__energy
+
+    @property
+    def wave_number(self) -> float:
+        return self.__k
+
+    @property
+    def sommerfeld(self) -> float:
+        return self.__eta
+
+    @property
+    def elements(self) -> numpy.ndarray:
+        '''
+        Nuclear S-matrix elements for `l = 0 .. lmax`
+
+        :return: `S_l`, dimensionless
+        :rtype: numpy.ndarray
+        '''
+        return self.__elements
+
+    def angular_distribution(self, angles: numpy.ndarray) -> Scattering:
+        '''
+        Elastic angular distribution rebuilt from the S-matrix on any c.m. angle grid.
+        The Legendre-sum engine of each grid is kept, so repeated calls cost one matrix product.
+
+        :return: cross sections, ratios to Rutherford and the reaction cross section
+        :rtype: Scattering
+        '''
+        angles = numpy.ascontiguousarray(angles, dtype=float)
+        key = angles.tobytes()
+
+        if key not in self.__waves:
+            self.__waves[key] = PartialWaves(self.__k, self.__eta, len(self.__elements) - 1, angles)
+
+        waves = self.__waves[key]
+        xsections, ratios = waves.cross_sections(self.__elements)
+
+        return Scattering(angles.copy(), xsections, ratios, float(waves.reaction_cross_section(self.__elements)), self.__elements)
+
+
+class SMatrixReader:
+    '''
+    Reads the S-matrix printed by ECIS with setting 56 on. The block belongs to the first
+    calculation of a run, i.e. to the optical parameters written in the deck, before any search.
+    '''
+    def __init__(self):
+        pass
+
+    def read(self, file: str) -> SMatrix:
+        with open(file, 'r') as txt:
+            buffer = txt.read().split('\n')
+
+        title = self.read_title(buffer)
+        ecr = EcisReader()
+        proj = Nuclei(*ecr.read_projectile(title))
+        targ = Nuclei(*ecr.read_target(title))
+        ener = ecr.read_energy(title)
+
+        k, eta = self.read_kinematics(buffer)
+        elements = self.read_smatrix(buffer)
+
+        return SMatrix(proj, targ, ener, k, eta, elements)
+
+    def read_title(self, buffer: list[str]) -> list[str]:
+        # The deck title is echoed inside the asterisk box that opens the report
+        line = next(line for line in buffer if '=' in line and 'MeV' in line and line.strip().startswith('*'))
+        return [line.strip().strip('*').strip()]
+
+    def read_kinematics(self, buffer: list[str]) -> tuple[float, float]:
+        start = next(i for i in range(len(buffer)) if 'WAVE NUMBER' in buffer[i] and 'COULOMB PARAMETER' in buffer[i])
+        incomes = buffer[start + 1].split()
+
+        return float(incomes[1]), float(incomes[2])
+
+    def read_smatrix(self, buffer: list[str]) -> numpy.ndarray:
+        elements = {}
+
+        for line in buffer:
+            match = SMATRIX_LINE.match(line)
+            if match is None:
+                continue
+
+            l = int(match.group(4))
+            if l in elements:
+                break
+
+            real = float(match.group(6).replace('D', 'E'))
+            imag = float(match.group(7).replace('D', 'E'))
+            elements[l] = complex(real, imag)
+
+        smatrix = numpy.ones(max(elements) + 1, dtype=complex)
+        for l, element in elements.items():
+            smatrix[l] = element
+
+        return smatrix
+
+
+if __name__ == '__main__':
+    pass
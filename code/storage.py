@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import os
+import gzip
+import lzma
+import shutil
+import tempfile
+from typing import IO
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Compressed members are recognised by their last suffix, `27Al+7Li_9.0_out.txt.xz`
+CODECS = {
+    '.gz': gzip.open,
+    '.xz': lzma.open
+}
+
+if zstandard is not None:
+    CODECS['.zst'] = zstandard.open
+
+
+def open_text(file: str, mode: str = 'r') -> IO[str]:
+    '''
+    `open` in text mode that reads and writes plain and compressed members alike, by suffix
+    '''
+    opener = CODECS.get(os.path.splitext(file)[1])
+    return open(file, mode) if opener is None else opener(file, mode + 't')
+
+
+def plain_name(file: str) -> str:
+    '''
+    :return: `file` without its compression suffix
+    :rtype: str
+    '''
+    stem, suffix = os.path.splitext(file)
+    return stem if suffix in CODECS else file
+
+
+def locate(file: str) -> str | None:
+    '''
+    :return: `file` itself or its compressed counterpart, whichever exists, `None` for neither
+    :rtype: str | None
+    '''
+    for candidate in [file] + [file + suffix for suffix in CODECS]:
+        if os.path.isfile(candidate):
+            return candidate
+
+    return None
+
+
+def compress_file(file: str, codec: str = '.xz') -> str:
+    '''
+    Replaces a plain file by its compressed member; the original is removed only once the member is complete
+
+    :return: compressed file
+    :rtype: str
+    '''
+    member = file + codec
+    with open(file, 'rb') as source:
+        content = source.read()
+
+    with CODECS[codec](member + '.part', 'wb') as target:
+        target.write(content)
+
+    os.replace(member + '.part', member)
+    os.remove(file)
+
+    return member
+
+
+def copy_member(source: str, target: str) -> None:
+    '''
+    Copies `source` to `target`, decompressing and compressing by their suffixes; `target`
+    appears only once complete, written under a temporary name of its own so concurrent copies never mix
+    '''
+    directory = os.path.dirname(target)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    handle, temporary = tempfile.mkstemp(suffix='.part', prefix=os.path.basename(target) + '.', dir=directory or None)
+    os.close(handle)
+
+    try:
+        with CODECS.get(os.path.splitext(source)[1], open)(source, 'rb') as reader:
+            with CODECS.get(os.path.splitext(target)[1], open)(temporary, 'wb') as writer:
+                shutil.copyfileobj(reader, writer)
+
+        os.replace(temporary, target)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def compress_tree(path: str, codec: str = '.xz', workers: int = None) -> int:
+    '''
+    Compresses every plain file under `path` in a process pool. `.xz` shrinks ECIS reports 11 times
+    against 6.6 times for `.gz`, which in turn decompresses three times faster.
+
+    :return: number of compressed files
+    :rtype: int
+    '''
+    files = [os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+             if os.path.splitext(name)[1] not in CODECS and not name.startswith('.')]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return len(list(pool.map(compress_file, files, [codec] * len(files), chunksize=16)))
+
+
+if __name__ == '__main__':
+    pass
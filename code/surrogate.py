@@ -0,0 +1,288 @@
+import os
+import time
+import numpy
+import pickle
+import keras
+from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import train_test_split
+
+from nuclei import Nuclei
+from dataset import Dataset
+from ecisreader import EcisReader, walk
+from opticalsolver import OpticalSolver
+from fitter import perturb
+from storage import open_text, locate, plain_name
+
+
+ANGLES = numpy.arange(1.0, 180.0, 1.0) # the 1 deg grid of ECIS reports
+
+
+class Surrogate:
+    '''
+    Forward optical model learned from solver outputs: (Zp, Ap, Zt, At, E, 10 parameters, theta)
+    maps to `ln(sigma / sigma_Ruth)`. Companion of `GOPENN`, which solves the inverse problem.
+    Meant for screening huge candidate sets; survivors go to `OpticalSolver`.
+    '''
+    FEATURES = 16
+    BATCH = 65536
+
+    def __init__(self, path: str, model_name: str) -> None:
+        self.model_path = path
+        self.model_name = model_name
+        self.model = None
+        self.xscale = None
+        self.yscale = None
+        self.held_out = None
+
+    @property
+    def model_folder(self) -> str:
+        return os.path.join(self.model_path, self.model_name)
+
+    @staticmethod
+    def features(proj: Nuclei, targ: Nuclei, energy: float, params: numpy.ndarray, angles: numpy.ndarray) -> numpy.ndarray:
+        '''
+        One input row per (parameter set, angle) pair
+
+        :return: features with shape `(N * n_angles, 16)`
+        :rtype: numpy.ndarray
+        '''
+        params = numpy.atleast_2d(numpy.asarray(params, dtype=float))
+        angles = numpy.asarray(angles, dtype=float)
+        N, M = len(params), len(angles)
+
+        rows = numpy.empty((N, M, Surrogate.FEATURES))
+        rows[:, :, :5] = [proj.Z, proj.A, targ.Z, targ.A, energy]
+        rows[:, :, 5:15] = params[:, None, :]
+        rows[:, :, 15] = angles[None, :]
+
+        return rows.reshape(N * M, Surrogate.FEATURES)
+
+    def sample(self, datasets: list[Dataset], perturbations: int = 64, seed: int = 0) -> tuple[numpy.ndarray, numpy.ndarray]:
+        '''
+        Training rows solved in-process around the labelled parameters of every dataset
+
+        :return: features with shape `(rows, 16)`, targets `ln(sigma / sigma_Ruth)` with shape `(rows, 1)`
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        '''
+        rng = numpy.random.default_rng(seed)
+        xs, ys = [], []
+
+        for dataset in datasets:
+            # `read_optical_parameters` drops zero entries, so only complete labels can be placed
+            if len(dataset.ys) != 10:
+                continue
+
+            Zp, Ap, Zt, At, energy = dataset.xs
+            proj, targ = Nuclei(int(Zp), int(Ap)), Nuclei(int(Zt), int(At))
+            params = perturb(numpy.repeat(dataset.ys[None, :], perturbations, axis=0), rng)
+            params[0] = dataset.ys
+
+            ratios = OpticalSolver(proj, targ, energy, ANGLES).solve_batch(params).ratios
+            xs.append(self.features(proj, targ, energy, params, ANGLES))
+            ys.append(numpy.log(ratios).reshape(-1, 1))
+
+        return numpy.concatenate(xs), numpy.concatenate(ys)
+
+    def prepare_data(self, xs: numpy.ndarray, ys: numpy.ndarray) -> tuple:
+        scaler_x = StandardScaler()
+        scaler_y = StandardScaler()
+
+        xs_scaled = scaler_x.fit_transform(xs)
+        ys_scaled = scaler_y.fit_transform(ys)
+
+        with open(os.path.join(self.model_folder, 'xscale.pkl'), 'wb') as file:
+            pickle.dump(scaler_x, file)
+
+        with open(os.path.join(self.model_folder, 'yscale.pkl'), 'wb') as file:
+            pickle.dump(scaler_y, file)
+
+        self.xscale, self.yscale = scaler_x, scaler_y
+        return train_test_split(xs_scaled, ys_scaled, test_size=0.2, train_size=0.8)
+
+    def build_model(self) -> keras.Sequential:
+        model = keras.Sequential([
+            keras.layers.Input(shape=(self.FEATURES,)),
+            keras.layers.Dense(128, activation='relu'),
+            keras.layers.Dense(128, activation='relu'),
+            keras.layers.Dense(128, activation='relu'),
+            keras.layers.Dense(128, activation='relu'),
+            keras.layers.Dense(1)
+        ])
+
+        model.compile(optimizer=keras.optimizers.Adam(), loss='mse', metrics=['mae'])
+
+        return model
+
+    def train_model(self, datasets: list[Dataset], perturbations: int = 64, holdout: float = 0.2, seed: int = 0) -> None:
+        '''
+        Trains on all but a `holdout` share of the reactions; the held-out ones, rows of (Zp, Ap, Zt, At, E),
+        are kept in `held_out` and `held_out.npy` for `report`
+        '''
+        EPOCHS = 100
+        datasets = list(datasets)
+
+        # Split reactions, not decks: `_in` and `_in_2` decks of one reaction go to the same side
+        reactions = numpy.unique(numpy.array([dataset.xs for dataset in datasets], dtype=float).reshape(-1, 5), axis=0)
+        order = numpy.random.default_rng(seed).permutation(len(reactions))
+        self.held_out = reactions[order[:int(round(holdout * len(reactions)))]]
+        numpy.save(os.path.join(self.model_folder, 'held_out.npy'), self.held_out)
+
+        held_out = {tuple(row) for row in self.held_out}
+        training = [dataset for dataset in datasets if tuple(numpy.asarray(dataset.xs, dtype=float)) not in held_out]
+
+        xs_train, xs_test, ys_train, ys_test = self.prepare_data(*self.sample(training, perturbations))
+
+        model = self.build_model()
+        checkpoint_filepath = os.path.join(self.model_folder, self.model_name + '.keras')
+
+        callbacks = [keras.callbacks.EarlyStopping(patience=10, restore_best_weights=True, start_from_epoch=10),
+                     keras.callbacks.ModelCheckpoint(filepath=checkpoint_filepath, monitor='loss', save_best_only=True)]
+
+        model.fit(x=xs_train, y=ys_train, epochs=EPOCHS, batch_size=1024, callbacks=callbacks)
+
+        loss, error = model.evaluate(xs_test, ys_test, batch_size=self.BATCH, verbose=2)
+        print("Loss = ", loss)
+        print("Error = ", error)
+
+        self.model = model
+
+    def load(self) -> None:
+        self.model = keras.models.load_model(os.path.join(self.model_folder, self.model_name + '.keras'), compile=False)
+
+        with open(os.path.join(self.model_folder, 'xscale.pkl'), 'rb') as file:
+            self.xscale = pickle.load(file)
+
+        with open(os.path.join(self.model_folder, 'yscale.pkl'), 'rb') as file:
+            self.yscale = pickle.load(file)
+
+        self.held_out = numpy.load(os.path.join(self.model_folder, 'held_out.npy'))
+
+    def predict(self, proj: Nuclei, targ: Nuclei, energy: float, params: numpy.ndarray, angles: numpy.ndarray = ANGLES) -> numpy.ndarray:
+        '''
+        Estimated ratios to Rutherford for every parameter set on one angle grid
+
+        :return: `sigma / sigma_Ruth` with shape `(N, n_angles)`
+        :rtype: numpy.ndarray
+        '''
+        if self.model is None:
+            self.load()
+
+        rows = self.xscale.transform(self.features(proj, targ, energy, params, angles))
+        scaled = self.model.predict(rows, batch_size=self.BATCH, verbose=0)
+
+        return numpy.exp(self.yscale.inverse_transform(scaled)).reshape(-1, len(angles))
+
+    def report(self, path: str) -> str:
+        '''
+        Accuracy and speed against the ECIS reports under `path` of the reactions held out in training,
+        other reports are skipped: the first 1 deg table of every report belongs to the potential written
+        in its deck. Writes `report.txt` into the model folder.
+
+        :return: the report, `Held-out reports: 0` alone when none is found
+        :rtype: str
+        '''
+        if self.model is None:
+            self.load()
+
+        ecr = EcisReader()
+        held_out = {tuple(numpy.round(row, 2)) for row in self.held_out}
+        errors, surrogate_time, solver_time, sets = [], 0.0, 0.0, 0
+
+        for out_file in walk(path):
+            in_file = deck_file(out_file)
+            if in_file is None:
+                continue
+
+            with open_text(in_file) as txt:
+                buffer = txt.read().split('\n')
+
+            proj, targ = Nuclei(*ecr.read_projectile(buffer)), Nuclei(*ecr.read_target(buffer))
+            energy, params = ecr.read_energy(buffer), numpy.array(ecr.read_potential_parameters(buffer))
+            if (proj.Z, proj.A, targ.Z, targ.A, round(energy, 2)) not in held_out:
+                continue
+
+            angles, ratios = read_ratios(out_file)
+            if len(angles) == 0:
+                continue
+
+            start = time.perf_counter()
+            predicted = self.predict(proj, targ, energy, params, angles)[0]
+            surrogate_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            OpticalSolver(proj, targ, energy, angles).solve(params)
+            solver_time += time.perf_counter() - start
+
+            errors.append(numpy.abs(numpy.log10(predicted / ratios)))
+            sets += 1
+
+        if sets == 0:
+            report = 'Held-out reports: 0\n'
+            with open(os.path.join(self.model_folder, 'report.txt'), 'w') as file:
+                file.write(report)
+
+            return report
+
+        errors = numpy.concatenate(errors)
+        rows = 10 ** 6
+        screening = self.features(Nuclei(3, 7), Nuclei(6, 12), 30.0, numpy.ones((rows // len(ANGLES), 10)), ANGLES)
+        start = time.perf_counter()
+        self.model.predict(self.xscale.transform(screening), batch_size=self.BATCH, verbose=0)
+        throughput = len(screening) / (time.perf_counter() - start)
+
+        report = f'Held-out reports: {sets}, points: {len(errors)}\n'
+        report += f'|log10 ratio error|: median {numpy.median(errors):.4f}, 90% {numpy.percentile(errors, 90):.4f}, max {numpy.max(errors):.4f}\n'
+        report += f'Per distribution: surrogate {1e3 * surrogate_time / sets:.3f} ms, solver {1e3 * solver_time / sets:.3f} ms\n'
+        report += f'Screening throughput: {throughput:.3e} points / s\n'
+
+        with open(os.path.join(self.model_folder, 'report.txt'), 'w') as file:
+            file.write(report)
+
+        return report
+
+
+def read_ratios(file: str) -> tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    First 1 deg elastic table of an ECIS report
+
+    :return: c.m. angles in deg, `sigma / sigma_Ruth`
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    '''
+    with open_text(file) as txt:
+        buffer = txt.read().split('\n')
+
+    header = next((i for i in range(len(buffer)) if 'ANGLE' in buffer[i] and 'C. S./RUTHER.' in buffer[i]), None)
+    if header is None:
+        return numpy.empty(0), numpy.empty(0)
+
+    rows = []
+    for line in buffer[header + 1:]:
+        incomes = line.split()
+        if len(incomes) != 3:
+            break
+        rows.append((float(incomes[0]), float(incomes[2])))
+
+    if not rows:
+        return numpy.empty(0), numpy.empty(0)
+
+    rows = numpy.array(rows)
+    return rows[:, 0], rows[:, 1]
+
+
+def deck_file(report: str) -> str | None:
+    '''
+    :return: the deck of a report in the mirrored `in` tree, `ecis/v1/out/27Al+7Li_9.0_out.txt` belonging
+             to `ecis/v1/in/27Al+7Li_9.0_in.txt`; `None` for files outside an `out` tree or without a deck
+    :rtype: str | None
+    '''
+    before, separator, after = report.rpartition(os.sep + 'out' + os.sep)
+    directory, name = os.path.split(after)
+    head, _, tail = plain_name(name).rpartition('_out')
+    if not separator or not head:
+        return None
+
+    return locate(os.path.join(before, 'in', directory, head + '_in' + tail))
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import os
+import numpy
+from concurrent.futures import ProcessPoolExecutor
+from nuclei import Nuclei
+from ecisgenerator import EcisGenerator
+from opticalsolver import OpticalSolver
+from fitter import perturb, sample_parameters
+
+
+# README constraints: these projectiles, targets with 1 < A < 17, 1 MeV < E / A < 10 MeV
+PROJECTILES = [
+    Nuclei(1, 1), Nuclei(1, 2), Nuclei(2, 3), Nuclei(2, 4), Nuclei(3, 6),
+    Nuclei(3, 7), Nuclei(3, 8), Nuclei(4, 9), Nuclei(4, 10), Nuclei(5, 10),
+    Nuclei(5, 11), Nuclei(6, 12), Nuclei(7, 14), Nuclei(7, 15), Nuclei(8, 16)
+]
+
+TARGETS = [
+    Nuclei(1, 2), Nuclei(2, 3), Nuclei(2, 4), Nuclei(3, 6), Nuclei(3, 7),
+    Nuclei(4, 9), Nuclei(5, 10), Nuclei(5, 11), Nuclei(6, 12), Nuclei(6, 13),
+    Nuclei(7, 14), Nuclei(7, 15), Nuclei(8, 16)
+]
+
+ENERGY_PER_NUCLEON = (1.0, 10.0) # MeV
+ANGLES = numpy.arange(1.0, 180.0, 1.0) # deg
+
+
+class SyntheticFactory:
+    '''
+    Synthetic labelled reactions: (projectile, target, energy) drawn inside the README constraints,
+    parameters from the registered global potential of the projectile (the `create_sample` defaults
+    when none applies) plus perturbations, angular distributions from `OpticalSolver`.
+    Shards are written by a process pool as `shard_XXXXX.npz` with arrays
+    `xs` (n, 5), `ys` (n, 10), `angles`, `ratios` (n, n_angles) and `reaction` (n,);
+    `Dataset.stream` reads them back one shard at a time.
+    '''
+    def __init__(self, path: str, shard_size: int = 1024, sets_per_reaction: int = 8) -> None:
+        self.__path = path
+        self.__shard_size = shard_size
+        self.__sets_per_reaction = sets_per_reaction
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def generate(self, shards: int, workers: int = None, seed: int = 0) -> list[str]:
+        '''
+        Writes `shards` shards of `shard_size` reactions each; shard `i` depends only on `(seed, i)`,
+        so interrupted runs can be resumed by skipping existing files
+
+        :return: shard files
+        :rtype: list[str]
+        '''
+        os.makedirs(self.__path, exist_ok=True)
+        files = [os.path.join(self.__path, f'shard_{i:05d}.npz') for i in range(shards)]
+        missing = [i for i in range(shards) if not os.path.isfile(files[i])]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = [pool.submit(make_shard, files[i], self.__shard_size, self.__sets_per_reaction, (seed, i)) for i in missing]
+            for job in jobs:
+                job.result()
+
+        return files
+
+
+def sample_reaction(rng: numpy.random.Generator) -> tuple[Nuclei, Nuclei, float]:
+    proj = PROJECTILES[rng.integers(len(PROJECTILES))]
+    targ = TARGETS[rng.integers(len(TARGETS))]
+    energy = round(float(rng.uniform(*ENERGY_PER_NUCLEON) * proj.A), 2)
+
+    return proj, targ, energy
+
+
+def make_shard(file: str, size: int, sets_per_reaction: int, seed: tuple[int, int]) -> str:
+    rng = numpy.random.default_rng(seed)
+    xs, ys, ratios, reaction = [], [], [], []
+
+    while len(xs) < size:
+        proj, targ, energy = sample_reaction(rng)
+        start = sample_parameters(EcisGenerator('', use_globalop=True).create_sample(proj, targ, energy))
+        params = perturb(numpy.repeat(start[None, :], sets_per_reaction, axis=0), rng)
+
+        scattering = OpticalSolver(proj, targ, energy, ANGLES).solve_batch(params)
+        for i in range(min(sets_per_reaction, size - len(xs))):
+            xs.append([proj.Z, proj.A, targ.Z, targ.A, energy])
+            ys.append(params[i])
+            ratios.append(scattering.ratios[i])
+            reaction.append(scattering.reaction[i])
+
+    # Written under a temporary name first, so a shard on disk is always complete
+    temporary = file + '.part'
+    with open(temporary, 'wb') as shard:
+        numpy.savez_compressed(shard, xs=numpy.array(xs), ys=numpy.array(ys), angles=ANGLES,
+                               ratios=numpy.array(ratios, dtype=numpy.float32), reaction=numpy.array(reaction))
+    os.replace(temporary, file)
+
+    return file
+
+
+if __name__ == '__main__':
+    pass
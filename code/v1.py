@@ -5,22 +5,20 @@ import keras
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 
-from dataset import Dataset
-from ecisreader import EcisReader
+from dataset import Dataset, DatasetTable
+from ecisreader import EcisReader, walk
+from storage import open_text
 
 
-def prepare_data(datasets: list[Dataset]) -> tuple:
-    xs = []
-    ys = []
+def prepare_data(datasets: list[Dataset] | DatasetTable) -> tuple:
+    table = datasets if isinstance(datasets, DatasetTable) else DatasetTable.from_datasets(datasets)
+    table = table[table.labelled]
     scaler_x = StandardScaler()
     scaler_y = StandardScaler()
 
-    for i in range(len(datasets)):
-        xs.append(datasets[i].xs[2:])
-        ys.append(datasets[i].ys)
-
-    xs_scaled = scaler_x.fit_transform(xs)
-    ys_scaled = scaler_y.fit_transform(ys)
+    # Zt, At, E
+    xs_scaled = scaler_x.fit_transform(table.xs[:, 2:])
+    ys_scaled = scaler_y.fit_transform(table.ys)
 
     with open('.\\models\\v1\\xscale.pkl', 'wb') as file:
         pickle.dump(scaler_x, file)
@@ -46,8 +44,12 @@ def build_model() -> keras.Sequential:
     return model
 
 
-def train_model() -> None:
-    datasets = Dataset.gather('.\\ecis\\v1\\in')
+def train_model(datasets: DatasetTable = None) -> None:
+    '''
+    Trains on `datasets`, e.g. rows selected by `Catalog.table`, or on the whole `ecis/v1/in` tree
+    '''
+    if datasets is None:
+        datasets = DatasetTable.gather(os.path.join('.', 'ecis', 'v1', 'in'))
     reaction_params_train, reaction_params_test, gops_train, gops_test = prepare_data(datasets)
 
     model = build_model()
@@ -65,9 +67,7 @@ def train_model() -> None:
 
 
 def get_prediction_data():
-    directory = '.\\ecis\\v1\\in\\'
-    files = os.listdir(directory)
-    files = [directory + files[i] for i in range(len(files))]
+    files = list(walk(os.path.join('.', 'ecis', 'v1', 'in')))
 
     Z_targ = []
     A_targ = []
@@ -75,7 +75,7 @@ def get_prediction_data():
     reader = EcisReader()
 
     for i in range(len(files)):
-        with open(files[i], 'r') as txt:
+        with open_text(files[i], 'r') as txt:
             buffer = txt.read().split('\n')
 
         Z, A = reader.read_target(buffer)
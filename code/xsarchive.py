@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import os
+import numpy
+from nuclei import Nuclei, Rutherford
+from ecisgenerator import EcisGenerator
+from ecisreader import walk
+from fitter import Experiment
+from storage import open_text
+
+
+# Columns of an archive, one `.npy` each so that every one of them can be memory-mapped
+COLUMNS = ('offsets', 'angles', 'values', 'xsections', 'reported', 'uncertainties',
+           'reactions', 'ratio', 'files', 'dois')
+
+
+class XSectionsArchive:
+    '''
+    All angular distributions of an `xsections` tree packed by `build_archive` in CSR layout:
+    distribution `i` occupies `offsets[i]:offsets[i + 1]` of the flat per-point columns
+
+        angles          c.m. angles, deg
+        values          the numbers of the file, ratios to Rutherford for `R/s` files
+        xsections       absolute sigma, mb / sr, the Rutherford conversion done at build time
+        reported        the error column of the file converted like `xsections`, NaN where absent
+        uncertainties   percentage uncertainties, as `EcisGenerator.take_xsections` assigns them
+
+    and per-reaction columns `reactions` (Zp, Ap, Zt, At, E), `ratio` (`R/s` flag), `files` relative
+    to the tree and the `dois` lines. Columns are memory-mapped, so a distribution is an O(1) slice.
+    '''
+    def __init__(self, path: str) -> None:
+        self.__path = path
+        self.__columns = load_columns(path, COLUMNS)
+        self.__index = None
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def __len__(self) -> int:
+        return len(self.__columns['files'])
+
+    def __getitem__(self, name: str) -> numpy.ndarray:
+        return self.__columns[name]
+
+    def slice(self, i: int) -> slice:
+        offsets = self.__columns['offsets']
+        return slice(int(offsets[i]), int(offsets[i + 1]))
+
+    def distribution(self, i: int) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        '''
+        :return: angles in deg, `sigma` in mb / sr and percentage uncertainties of reaction `i`
+        :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        '''
+        part = self.slice(i)
+        return self.__columns['angles'][part], self.__columns['xsections'][part], self.__columns['uncertainties'][part]
+
+    def experiment(self, i: int) -> Experiment:
+        Zp, Ap, Zt, At, energy = self.__columns['reactions'][i]
+        return Experiment(Nuclei(int(Zp), int(Ap)), Nuclei(int(Zt), int(At)), float(energy), *self.distribution(i))
+
+    def find(self, file: str) -> int:
+        '''
+        :return: index of the reaction read from `file`, relative to the tree
+        :rtype: int
+        '''
+        if self.__index is None:
+            self.__index = {str(name): i for i, name in enumerate(self.__columns['files'])}
+
+        return self.__index[os.path.normpath(file)]
+
+
+def build_archive(path: str, archive: str, errors: list[tuple[str, Exception]] = None) -> int:
+    '''
+    Packs every angular distribution under `path` into the `archive` directory;
+    files that fail to parse are skipped and appended to `errors` as `(file, exception)`
+
+    :return: number of packed reactions
+    :rtype: int
+    '''
+    gen = EcisGenerator('')
+    ruth = Rutherford()
+    points = {name: [] for name in ('angles', 'values', 'xsections', 'reported')}
+    lengths, reactions, ratio, files, dois = [], [], [], [], []
+
+    for file in walk(path):
+        try:
+            with open_text(file) as text:
+                buffer = text.read().rstrip().split('\n')
+
+            beam, target, energy = gen.find_beam(buffer), gen.find_target(buffer), gen.find_energy(buffer)
+            start = next(i for i in range(len(buffer)) if 'Angle' in buffer[i]) + 1
+            rows = [line.split() for line in buffer[start:]]
+            table = numpy.array([[float(row[0]), float(row[1]), float(row[2]) if len(row) > 2 else numpy.nan] for row in rows]).reshape(-1, 3)
+        except (OSError, ValueError, IndexError, KeyError, StopIteration) as error:
+            if errors is not None:
+                errors.append((file, error))
+            continue
+
+        relative = 'R/s' in buffer[start - 1]
+        scale = ruth.cross_sections(beam, target, energy, table[:, 0]) if relative else numpy.ones(len(table))
+
+        points['angles'].append(table[:, 0])
+        points['values'].append(table[:, 1])
+        points['xsections'].append(table[:, 1] * scale)
+        points['reported'].append(table[:, 2] * scale)
+
+        lengths.append(len(table))
+        reactions.append([beam.Z, beam.A, target.Z, target.A, energy])
+        ratio.append(relative)
+        files.append(os.path.relpath(file, path))
+        dois.append(buffer[1].strip())
+
+    columns = {name: numpy.concatenate(values) if values else numpy.empty(0) for name, values in points.items()}
+    columns['uncertainties'] = numpy.full(len(columns['angles']), 10.0)
+    columns['offsets'] = numpy.concatenate([[0], numpy.cumsum(lengths, dtype=numpy.int64)])
+    columns['reactions'] = numpy.array(reactions, dtype=float).reshape(-1, 5)
+    columns['ratio'] = numpy.array(ratio, dtype=bool)
+    columns['files'] = numpy.array(files, dtype=str)
+    columns['dois'] = numpy.array(dois, dtype=str)
+
+    save_columns(archive, columns)
+
+    return len(files)
+
+
+def save_columns(path: str, columns: dict[str, numpy.ndarray]) -> None:
+    os.makedirs(path, exist_ok=True)
+    for name, column in columns.items():
+        numpy.save(os.path.join(path, name + '.npy'), column)
+
+
+def load_columns(path: str, names: tuple[str, ...]) -> dict[str, numpy.ndarray]:
+    '''
+    Memory-mapped `.npy` columns of an archive directory
+    '''
+    return {name: numpy.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in names}
+
+
+if __name__ == '__main__':
+    for version in ('v0', 'v1', 'v2'):
+        tree = os.path.join('..', 'xsections', version)
+        print(version, build_archive(tree, tree + '.xsa'))
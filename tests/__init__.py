@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CODE = os.path.join(ROOT, 'code')
+
+# The modules under `code` import each other by bare name, as when run from that directory
+if CODE not in sys.path:
+    sys.path.insert(0, CODE)
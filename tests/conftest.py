@@ -0,0 +1,15 @@
+import os
+import shutil
+import pytest
+from tests import ROOT
+
+
+@pytest.fixture
+def v1(tmp_path):
+    '''
+    Copy of the `v1` experiments, decks and reports under a temporary root, safe to modify
+    '''
+    for tree in (os.path.join('xsections', 'v1'), os.path.join('ecis', 'v1')):
+        shutil.copytree(os.path.join(ROOT, tree), os.path.join(tmp_path, tree))
+
+    return str(tmp_path)
@@ -0,0 +1,35 @@
+import os
+from tests import ROOT
+from catalog import Catalog
+
+
+def test_update_indexes_every_tree_once(tmp_path):
+    catalog = Catalog(ROOT, database=str(tmp_path / 'catalog.sqlite'))
+    errors = []
+
+    assert catalog.update(errors) == 1104
+    assert catalog.update() == 0
+    assert [os.path.basename(file) for file, _ in errors] == ['3He+d_10.0_in.txt']
+
+    count = lambda query: catalog.connection.execute(query).fetchone()[0]
+    assert count('SELECT COUNT(*) FROM decks') == 457
+    assert count('SELECT COUNT(*) FROM runs') == count('SELECT COUNT(DISTINCT deck) FROM runs') == 457
+    assert count('SELECT COUNT(*) FROM runs WHERE experiment IS NULL') == 2
+
+    catalog.close()
+
+
+def test_update_drops_removed_files_and_their_reaction(v1, tmp_path):
+    catalog = Catalog(v1, database=str(tmp_path / 'catalog.sqlite'))
+    catalog.update()
+    reactions = catalog.connection.execute('SELECT COUNT(*) FROM reactions').fetchone()[0]
+
+    for tree, name in (('xsections', '28Si+7Li @ 10.0 MeV.txt'), ('ecis', os.path.join('in', '28Si+7Li_10.0_in.txt')),
+                       ('ecis', os.path.join('out', '28Si+7Li_10.0_out.txt'))):
+        os.remove(os.path.join(v1, tree, 'v1', name))
+
+    assert catalog.update() == 3
+    assert catalog.connection.execute('SELECT COUNT(*) FROM reactions').fetchone()[0] == reactions - 1
+    assert catalog.select(projectile='7Li', target='28Si', energy=(10.0, 10.0)) == []
+
+    catalog.close()
@@ -0,0 +1,56 @@
+import os
+import numpy
+import pytest
+from dataset import Dataset, DatasetTable
+from ecisdeck import EcisDeck
+
+
+def test_warm_gather_equals_cold(v1, tmp_path):
+    path, cache = os.path.join(v1, 'ecis', 'v1', 'in'), str(tmp_path / 'cache' / 'v1.npz')
+    parsed = []
+
+    cold = DatasetTable.gather(path, cache=cache, workers=1)
+    warm = DatasetTable.gather(path, cache=cache, workers=1, progress=lambda done, total, file: parsed.append(file))
+
+    assert len(cold) == 95 and os.path.isfile(cache)
+    assert parsed == []
+    numpy.testing.assert_array_equal(warm.xs, cold.xs)
+    numpy.testing.assert_array_equal(warm.ys, cold.ys)
+
+
+def test_gather_rereads_modified_file(v1, tmp_path):
+    path, cache = os.path.join(v1, 'ecis', 'v1', 'in'), str(tmp_path / 'cache' / 'v1.npz')
+    file = os.path.join(path, '28Si+7Li_13.0_in.txt')
+    parsed = []
+
+    before = Dataset.gather(path, cache=cache, workers=1)
+    index = next(i for i, dataset in enumerate(before) if tuple(dataset.xs) == (3, 7, 14, 28, 13.0))
+
+    deck = EcisDeck.read(file)
+    opticals = deck.opticals.copy()
+    opticals[0, 0] += 1
+    deck.opticals = opticals
+    deck.write(file)
+    # Coarse file system clocks could leave the stamp unchanged within one test
+    stat = os.stat(file)
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    after = Dataset.gather(path, cache=cache, workers=1, progress=lambda done, total, file: parsed.append(file))
+
+    assert parsed == [file]
+    assert after[index].ys[0] == pytest.approx(before[index].ys[0] + 1)
+    assert all(numpy.array_equal(a.ys, b.ys) for i, (a, b) in enumerate(zip(before, after)) if i != index)
+
+
+def test_gather_caches_failures(v1, tmp_path):
+    path, cache = os.path.join(v1, 'ecis', 'v1', 'in'), str(tmp_path / 'cache' / 'v1.npz')
+    with open(os.path.join(path, 'broken_in.txt'), 'w') as deck:
+        deck.write('not a deck\n')
+
+    cold, warm = [], []
+    Dataset.gather(path, cache=cache, workers=1, errors=cold)
+    Dataset.gather(path, cache=cache, workers=1, errors=warm, progress=lambda done, total, file: warm.append(file))
+
+    assert [file for file, _ in cold] == [os.path.join(path, 'broken_in.txt')]
+    assert [file for file, _ in warm] == [file for file, _ in cold]
+    assert type(warm[0][1]) is type(cold[0][1])
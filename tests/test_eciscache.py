@@ -0,0 +1,58 @@
+import os
+from tests import ROOT
+from ecisdeck import EcisDeck
+from eciscache import ResultCache, deck_key, executable_key
+
+
+def write_report(path, name: str) -> str:
+    # Hex of random bytes, so every compressed report takes about 10 kB
+    file = str(path / name)
+    with open(file, 'w') as report:
+        report.write(os.urandom(10000).hex())
+    return file
+
+
+def test_get_returns_what_put_stored(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    report = write_report(tmp_path, 'report.txt')
+
+    assert not cache.get('a' * 64, str(tmp_path / 'miss.txt'))
+    cache.put('a' * 64, report, 2.5)
+    assert cache.get('a' * 64, str(tmp_path / 'hit.txt'))
+
+    with open(report) as stored, open(tmp_path / 'hit.txt') as copied:
+        assert copied.read() == stored.read()
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.stores, cache.stats.saved) == (1, 1, 1, 2.5)
+
+    cache.close()
+
+
+def test_put_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), capacity=25000)
+    keys = [character * 64 for character in 'abc']
+
+    cache.put(keys[0], write_report(tmp_path, 'a.txt'), 1.0)
+    cache.put(keys[1], write_report(tmp_path, 'b.txt'), 1.0)
+    assert cache.get(keys[0], str(tmp_path / 'out.txt'))
+    cache.put(keys[2], write_report(tmp_path, 'c.txt'), 1.0)
+
+    assert keys[0] in cache and keys[1] not in cache and keys[2] in cache
+    assert not os.path.exists(cache.file(keys[1]))
+    assert cache.stats.evictions == 1 and cache.size <= cache.capacity
+
+    cache.close()
+
+
+def test_keys_depend_on_deck_and_executable(tmp_path):
+    first, second = write_report(tmp_path, 'ecis1'), write_report(tmp_path, 'ecis2')
+    deck = EcisDeck.read(os.path.join(ROOT, 'ecis', 'v1', 'in', '28Si+7Li_10.0_in.txt'))
+    retitled = EcisDeck.parse('\n'.join(('another title',) + deck.lines[1:]))
+    potential = deck.opticals.copy()
+    potential[0, 0] += 1
+    changed = EcisDeck.parse(deck.text)
+    changed.opticals = potential
+
+    assert deck_key(deck, executable_key([first])) == deck_key(retitled, executable_key([first]))
+    assert deck_key(deck, executable_key([first])) != deck_key(deck, executable_key([second]))
+    assert deck_key(deck) != deck_key(changed)
+    assert deck_key('not a deck') is None
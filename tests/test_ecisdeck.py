@@ -0,0 +1,23 @@
+import os
+from tests import ROOT
+from ecisdeck import EcisDeck
+from ecisreader import walk
+from storage import open_text
+
+
+def test_parse_round_trips_every_deck():
+    decks = 0
+
+    for version in ('v0', 'v1', 'v2'):
+        for file in walk(os.path.join(ROOT, 'ecis', version, 'in')):
+            with open_text(file) as cards:
+                text = cards.read()
+
+            # `ecis/v0/in/16O/3He+d_10.0_in.txt` is an empty placeholder, not a deck
+            if not text:
+                continue
+
+            assert EcisDeck.parse(text).text == text, file
+            decks += 1
+
+    assert decks == 457
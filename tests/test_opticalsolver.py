@@ -0,0 +1,37 @@
+import os
+import numpy
+from tests import ROOT
+from nuclei import Nuclei
+from ecisreader import EcisReader, walk
+from ecisoutput import read_report
+from ecisrunner import report_file
+from opticalsolver import OpticalSolver
+from storage import locate, plain_name
+
+
+ANGLES = numpy.arange(5.0, 171.0, 1.0)
+
+
+def test_ratios_match_ecis_reports():
+    # Per report median of |log10(ours / ECIS)| over 5-170 deg, for the final potential of every v1 search.
+    # A few searches that ended far off (chi2 in the thousands, mostly the 7Li runs above 30 MeV) disagree
+    # with the report's own table at every step and radius, so the bound is on the bulk rather than each one.
+    errors = []
+
+    for deck in walk(os.path.join(ROOT, 'ecis', 'v1', 'in')):
+        report = locate(plain_name(report_file(deck)))
+        if report is None:
+            continue
+
+        inputs, _ = EcisReader().read(deck)
+        report = read_report(report)
+        angular = report.angular[numpy.isin(report.angular[:, 0], ANGLES)]
+
+        proj, targ = Nuclei(int(inputs[0]), int(inputs[1])), Nuclei(int(inputs[2]), int(inputs[3]))
+        ratios = OpticalSolver(proj, targ, float(inputs[4]), angular[:, 0]).solve(report.potential).ratios
+        errors.append(numpy.median(numpy.abs(numpy.log10(ratios / angular[:, 2]))))
+
+    errors = numpy.array(errors)
+    assert len(errors) == 95
+    assert numpy.median(errors) < 0.01
+    assert numpy.mean(errors < 0.01) > 0.8
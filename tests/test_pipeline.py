@@ -0,0 +1,38 @@
+import os
+import sys
+import numpy
+from tests import ROOT, CODE
+from pipeline import Pipeline
+from ecisrunner import EcisRunner
+from eciscache import ResultCache
+from dataset import DatasetTable
+
+
+def read_table(pipeline: Pipeline) -> DatasetTable:
+    with numpy.load(pipeline.dataset_file) as archive:
+        return DatasetTable(archive['xs'], archive['ys'])
+
+
+def test_incremental_run(v1, tmp_path):
+    # `fakeecis.py` answers every deck with the committed `v1` report of its reaction instead of running ECIS
+    command = [sys.executable, os.path.join(CODE, 'fakeecis.py'), os.path.join(ROOT, 'ecis', 'v1')]
+    cache = ResultCache(str(tmp_path / 'cache'))
+    pipeline = Pipeline(v1, versions=('v1',), runner=EcisRunner(command, cache=cache), workers=2)
+    errors = []
+
+    # Decks and reports on disk are adopted, so the first run only builds the dataset
+    assert pipeline.run(until='dataset', errors=errors) == {'decks': 0, 'reports': 0, 'dataset': 95}
+    table = read_table(pipeline)
+    assert len(table) == 95 and numpy.array_equal(table.xs, DatasetTable.gather(os.path.join(v1, 'ecis', 'v1', 'in'), cache='').xs)
+
+    assert pipeline.run(until='dataset', errors=errors) == {'decks': 0, 'reports': 0, 'dataset': 0}
+
+    # A modified experiment costs one deck, one ECIS run and one row
+    with open(os.path.join(v1, 'xsections', 'v1', '28Si+7Li @ 10.0 MeV.txt'), 'a') as experiment:
+        experiment.write(' ')
+    assert pipeline.run(until='dataset', errors=errors) == {'decks': 1, 'reports': 1, 'dataset': 1}
+    assert cache.stats.stores == 1 and len(read_table(pipeline)) == 95
+
+    assert errors == []
+    pipeline.close()
+    cache.close()